@@ -0,0 +1,44 @@
+import base64
+from typing import Optional
+
+import bson
+from bson.codec_options import CodecOptions
+from fastapi import HTTPException
+
+# Keyset pagination: list endpoints keep returning plain arrays and report the
+# cursor for the next page in the X-Next-Cursor header when the page is full
+MAX_PAGE_SIZE = 1000
+# Documents fetched per cursor round trip when list endpoints iterate results
+CURSOR_BATCH_SIZE = 200
+# Decode cursor datetimes as aware UTC values, like the tz_aware database client
+CURSOR_CODEC_OPTIONS = CodecOptions(tz_aware=True)
+
+def keyset_filter(sort: list, after: Optional[str]) -> dict:
+    """Build the filter selecting documents that come after a cursor in the given sort"""
+    if not after:
+        return {}
+    try:
+        values = bson.decode(base64.urlsafe_b64decode(after.encode()), codec_options=CURSOR_CODEC_OPTIONS)["k"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+def next_cursor_headers(docs: list, sort: list, limit: int) -> dict:
+    """Get the X-Next-Cursor header for a page, empty when it is the last page.
+    
+    Pass the documents as stored, before any defaults are filled in for
+    serialization, so the cursor holds the values the next query compares against.
+    """
+    if len(docs) < limit:
+        return {}
+    last = docs[-1]
+    cursor = base64.urlsafe_b64encode(bson.encode({"k": [last.get(field) for field, _ in sort]})).decode()
+    return {"X-Next-Cursor": cursor}
@@ -7,6 +7,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from twilio.rest import Client as TwilioClient
 from typing import List, Dict, Any
 import asyncio
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -119,8 +120,8 @@ class ReminderService:
             # Find members expiring on the target date
             members = await self.db.members.find({
                 "membership_end": {
-                    "$gte": start_of_day.isoformat(),
-                    "$lte": end_of_day.isoformat()
+                    "$gte": start_of_day,
+                    "$lte": end_of_day
                 },
                 "current_payment_status": {"$in": ["paid", "pending"]}  # Don't remind expired members
             }).to_list(100)
@@ -179,7 +180,10 @@ class ReminderService:
         """Create reminder message text with payment details using editable template"""
         try:
             membership_type = member.get('membership_type', 'monthly').replace('_', ' ').title()
-            expiry_date = datetime.fromisoformat(member['membership_end']).strftime('%d %b %Y')
+            expiry_date = member['membership_end']
+            if isinstance(expiry_date, str):
+                expiry_date = datetime.fromisoformat(expiry_date)
+            expiry_date = expiry_date.strftime('%d %b %Y')
             
             if days == 7:
                 urgency = "soon"
@@ -328,6 +332,7 @@ Thank you for choosing Iron Paradise Gym! 💪
         """Log that a reminder was sent"""
         try:
             log_entry = {
+                "id": str(uuid.uuid4()),
                 "member_id": member_id,
                 "days_before_expiry": days,
                 "sent_date": datetime.now(timezone.utc).date().isoformat(),
@@ -348,7 +353,9 @@ Thank you for choosing Iron Paradise Gym! 💪
                 return {"success": False, "error": "Member not found"}
             
             # Calculate days until expiry
-            expiry_date = datetime.fromisoformat(member['membership_end'])
+            expiry_date = member['membership_end']
+            if isinstance(expiry_date, str):
+                expiry_date = datetime.fromisoformat(expiry_date)
             if expiry_date.tzinfo is None:
                 expiry_date = expiry_date.replace(tzinfo=timezone.utc)
             days_until_expiry = (expiry_date - datetime.now(timezone.utc)).days
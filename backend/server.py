@@ -1,11 +1,16 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Query
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne, UpdateMany, WriteConcern
+from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, TypeAdapter
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
@@ -14,10 +19,18 @@ import razorpay
 from whatsapp_service import initialize_whatsapp_service, get_whatsapp_service
 from reminder_service import init_reminder_service, get_reminder_service
 from payu_service import initialize_payu_service, get_payu_service
-from jose import JWTError, jwt
+from ttl_cache import TTLCache
+from pagination import MAX_PAGE_SIZE, CURSOR_BATCH_SIZE, keyset_filter, next_cursor_headers
+import jwt
+from jwt import PyJWTError as JWTError
 import hashlib
+import functools
+import html
+import re
+import hmac
+import base64
 import secrets
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import Depends, status
 
 ROOT_DIR = Path(__file__).parent
@@ -32,24 +45,52 @@ logger = logging.getLogger(__name__)
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '200')),
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', '20')),
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000')),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '3000')),
+    retryWrites=True
+)
 db = client[os.environ['DB_NAME']]
 
+# Bulk state changes a user acts on are acknowledged by a majority so they survive a failover
+MAJORITY_WRITE_CONCERN = WriteConcern(w="majority", wtimeout=5000)
+
 # Razorpay client
-razorpay_client = razorpay.Client(auth=(os.environ['RAZORPAY_KEY_ID'], os.environ['RAZORPAY_KEY_SECRET']))
+RAZORPAY_KEY_ID = os.environ['RAZORPAY_KEY_ID']
+RAZORPAY_KEY_SECRET = os.environ['RAZORPAY_KEY_SECRET']
+RAZORPAY_KEY_SECRET_BYTES = RAZORPAY_KEY_SECRET.encode()
+razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+
+# Where PayU callbacks redirect the browser after a payment
+FRONTEND_URL = os.environ.get('REACT_APP_FRONTEND_URL', 'http://localhost:3000')
+
+# Origins allowed by CORS; blank entries from stray commas or spaces are ignored
+CORS_ORIGINS = [origin.strip() for origin in os.environ.get('CORS_ORIGINS', '*').split(',') if origin.strip()]
 
 # Authentication setup
 SECRET_KEY = os.environ['JWT_SECRET_KEY']
 ALGORITHM = os.environ['JWT_ALGORITHM']
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ['ACCESS_TOKEN_EXPIRE_MINUTES'])
 
-# Using SHA256 with salt for password hashing (simpler approach)
+# Signing key encoded once and a reusable PyJWT instance for token encode/decode
+SECRET_KEY_BYTES = SECRET_KEY.encode()
+jwt_api = jwt.PyJWT()
+
+# Using PBKDF2-HMAC-SHA256 for password hashing; legacy salted SHA256 hashes still verify
+PBKDF2_ITERATIONS = 200_000
+
 def create_salt():
-    return secrets.token_hex(32)
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+    return secrets.token_bytes(16)
 
 # Create the main app without a prefix
-app = FastAPI(title="Iron Paradise Gym Management System")
+app = FastAPI(
+    title="Iron Paradise Gym Management System",
+    default_response_class=ORJSONResponse
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -57,6 +98,16 @@ api_router = APIRouter(prefix="/api")
 # Initialize reminder service
 reminder_service_instance = None
 
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_bg_tasks = set()
+
+def run_in_background(coro):
+    """Schedule a side-effect coroutine without making the response wait for it"""
+    task = asyncio.create_task(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+    return task
+
 # Enums
 class MembershipType(str, Enum):
     MONTHLY = "monthly"
@@ -127,6 +178,9 @@ class Member(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Projection limited to the fields the Member model needs
+MEMBER_PROJECTION = {"_id": 0, **{field: 1 for field in Member.model_fields}}
+
 class PaymentRecord(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     member_id: str
@@ -137,6 +191,9 @@ class PaymentRecord(BaseModel):
     transaction_id: Optional[str] = None
     razorpay_payment_id: Optional[str] = None
 
+class MemberDetails(Member):
+    payments: List[PaymentRecord] = Field(default_factory=list)
+
 class PaymentCreate(BaseModel):
     member_id: str
     amount: float
@@ -178,6 +235,9 @@ class User(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Projection limited to the fields the User model needs
+USER_PROJECTION = {"_id": 0, **{field: 1 for field in User.model_fields}}
+
 class UserCreate(BaseModel):
     username: str
     email: EmailStr
@@ -309,50 +369,106 @@ class SystemNotification(BaseModel):
     read: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# List adapters validate whole result sets with one compiled validator
+permission_list_adapter = TypeAdapter(List[Permission])
+payment_record_list_adapter = TypeAdapter(List[PaymentRecord])
+
 # Authentication Helper Functions
 def verify_password(plain_password, stored_hash):
     try:
-        # stored_hash format: "salt:hash"
+        if stored_hash.startswith("pbkdf2_sha256$"):
+            # stored_hash format: "pbkdf2_sha256$iterations$salt$hash" (base64 salt and hash)
+            _, iterations, salt, hash_value = stored_hash.split('$')
+            derived = hashlib.pbkdf2_hmac('sha256', plain_password.encode(), base64.b64decode(salt), int(iterations))
+            return hmac.compare_digest(derived, base64.b64decode(hash_value))
+        
+        # Legacy stored_hash format: "salt:hash"
         salt, hash_value = stored_hash.split(':')
-        return hash_value == hashlib.sha256((plain_password + salt).encode()).hexdigest()
+        return hmac.compare_digest(hash_value, hashlib.sha256((plain_password + salt).encode()).hexdigest())
     except Exception:
         return False
 
 def get_password_hash(password):
     salt = create_salt()
-    hash_value = hashlib.sha256((password + salt).encode()).hexdigest()
-    return f"{salt}:{hash_value}"
+    hash_value = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${base64.b64encode(salt).decode()}${base64.b64encode(hash_value).decode()}"
+
+def password_needs_rehash(stored_hash) -> bool:
+    """Check if a stored hash uses a legacy format or iteration count"""
+    return not stored_hash.startswith(f"pbkdf2_sha256${PBKDF2_ITERATIONS}$")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
+        expire = now + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt_api.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def authenticate_token(token: str) -> Optional[User]:
+    """Resolve a bearer token to its user, or None if the token is not valid"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
+        payload = jwt_api.decode(token, SECRET_KEY_BYTES, algorithms=[ALGORITHM])
     except JWTError:
-        raise credentials_exception
+        return None
     
-    user = await db.users.find_one({"username": token_data.username})
+    username = payload.get("sub")
+    if username is None:
+        return None
+    
+    # Read the user on every request so deletes, deactivations and role changes apply on all workers at once
+    user = await db.users.find_one({"username": username}, USER_PROJECTION)
     if user is None:
-        raise credentials_exception
+        return None
     return User(**parse_from_mongo(user))
 
+class AuthMiddleware:
+    """Pure ASGI middleware that authenticates the bearer token once per request.
+    
+    The resolved user (None for an invalid token) is stored in scope["state"],
+    so route dependencies read it from request.state instead of re-parsing the
+    header, decoding the JWT and querying MongoDB through the dependency graph.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # ASGI servers lowercase header names, so the raw list can be scanned directly
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                if value[:7].lower() == b"bearer ":
+                    token = value[7:].decode("latin-1").strip()
+                    scope.setdefault("state", {})["user"] = await authenticate_token(token)
+                break
+        
+        await self.app(scope, receive, send)
+
+async def get_current_user(request: Request):
+    state = request.scope.get("state", {})
+    if "user" not in state:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user = state["user"]
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -410,7 +526,7 @@ async def initialize_default_permissions():
         ]
         
         for perm in default_permissions:
-            perm_dict = prepare_for_mongo(perm.dict())
+            perm_dict = perm.model_dump()
             await db.permissions.insert_one(perm_dict)
         
         logger.info("Default permissions initialized")
@@ -418,40 +534,44 @@ async def initialize_default_permissions():
     except Exception as e:
         logger.error(f"Error initializing permissions: {e}")
 
+async def get_role_permissions(role_id: str) -> List[str]:
+    """Resolve a custom role's permission keys from the stored role"""
+    # Read the role directly: the result is written to users, and a per-process cache could persist stale keys
+    custom_role = await db.custom_roles.find_one({"id": role_id}, {"_id": 0, "permissions": 1})
+    if not custom_role:
+        return []
+    # Get permissions from custom role in a single $in query
+    role_perms = await db.permissions.find(
+        {"id": {"$in": custom_role.get("permissions", [])}},
+        {"_id": 0, "module": 1, "actions": 1}
+    ).to_list(None)
+    return [f"{perm['module']}:{action}" for perm in role_perms for action in perm.get("actions", [])]
+
+async def compute_permissions(user: dict) -> List[str]:
+    """Resolve the cached permission list for a user document based on its role"""
+    if user.get("role") == "admin":
+        # Admin gets all permissions through check_permission's role bypass, so nothing is cached
+        return []
+    
+    if user.get("custom_role_id"):
+        return await get_role_permissions(user["custom_role_id"])
+    
+    # Default role permissions
+    role_permissions = {
+        "manager": ["members:read", "members:write", "payments:read", "payments:write", "reports:read", "reminders:write"],
+        "trainer": ["members:read", "reminders:write"],
+        "receptionist": ["members:read", "members:write", "payments:read", "payments:write"]
+    }
+    return role_permissions.get(user.get("role"), [])
+
 async def update_user_permissions(user_id: str):
     """Update user's cached permissions based on role"""
     try:
-        user = await db.users.find_one({"id": user_id})
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "role": 1, "custom_role_id": 1})
         if not user:
             return
         
-        permissions = []
-        
-        if user.get("role") == "admin":
-            # Admin gets all permissions
-            all_perms = await db.permissions.find().to_list(1000)
-            for perm in all_perms:
-                for action in perm.get("actions", []):
-                    permissions.append(f"{perm['module']}:{action}")
-        
-        elif user.get("custom_role_id"):
-            # Get permissions from custom role
-            custom_role = await db.custom_roles.find_one({"id": user["custom_role_id"]})
-            if custom_role:
-                for perm_id in custom_role.get("permissions", []):
-                    perm = await db.permissions.find_one({"id": perm_id})
-                    if perm:
-                        for action in perm.get("actions", []):
-                            permissions.append(f"{perm['module']}:{action}")
-        
-        else:
-            # Default role permissions
-            role_permissions = {
-                "manager": ["members:read", "members:write", "payments:read", "payments:write", "reports:read", "reminders:write"],
-                "trainer": ["members:read", "reminders:write"],
-                "receptionist": ["members:read", "members:write", "payments:read", "payments:write"]
-            }
-            permissions = role_permissions.get(user.get("role"), [])
+        permissions = await compute_permissions(user)
         
         # Update user's cached permissions
         await db.users.update_one(
@@ -462,11 +582,43 @@ async def update_user_permissions(user_id: str):
     except Exception as e:
         logger.error(f"Error updating user permissions: {e}")
 
+async def update_role_users_permissions(role_id: str):
+    """Update cached permissions of every user with a custom role in one write"""
+    try:
+        # Resolve the role's permissions once; admins keep their empty list
+        permissions = await compute_permissions({"custom_role_id": role_id})
+        
+        await db.users.update_many(
+            {"custom_role_id": role_id, "role": {"$ne": "admin"}},
+            {"$set": {"permissions": permissions}}
+        )
+        
+    except Exception as e:
+        logger.error(f"Error updating permissions for role {role_id}: {e}")
+
 # Helper functions
+SETTINGS_CACHE_TTL = 60  # seconds; fee and rate settings change rarely
+settings_cache = TTLCache(SETTINGS_CACHE_TTL)
+
+async def get_named_setting(setting_name: str) -> Optional[dict]:
+    """Get a named gym_settings document, cached for SETTINGS_CACHE_TTL seconds"""
+    return await settings_cache.get(
+        setting_name,
+        lambda: db.gym_settings.find_one({"setting_name": setting_name}, {"_id": 0})
+    )
+
+def invalidate_named_setting(setting_name: str):
+    """Drop a cached gym_settings document after it is updated"""
+    settings_cache.invalidate(setting_name)
+    # The WhatsApp service keeps its own copy of the reminder settings
+    whatsapp_service = get_whatsapp_service()
+    if whatsapp_service:
+        whatsapp_service.invalidate_setting_cache(setting_name)
+
 async def calculate_membership_fee(membership_type: MembershipType) -> float:
     """Calculate membership fee based on type"""
     # Get current settings from database
-    settings = await db.gym_settings.find_one({"setting_name": "membership_rates"})
+    settings = await get_named_setting("membership_rates")
     if settings and "rates" in settings:
         rates = settings["rates"]
     else:
@@ -482,7 +634,7 @@ async def calculate_membership_fee(membership_type: MembershipType) -> float:
 
 async def get_admission_fee() -> float:
     """Get current admission fee for monthly membership"""
-    settings = await db.gym_settings.find_one({"setting_name": "admission_fee"})
+    settings = await get_named_setting("admission_fee")
     if settings and "amount" in settings:
         return settings["amount"]
     return 1500.0  # Default admission fee
@@ -491,7 +643,7 @@ async def calculate_membership_extension(payment_amount: float) -> int:
     """Calculate membership extension days based on payment amount"""
     try:
         # Get current membership rates
-        settings = await db.gym_settings.find_one({"setting_name": "membership_rates"})
+        settings = await get_named_setting("membership_rates")
         if settings and "rates" in settings:
             rates = settings["rates"]
         else:
@@ -517,9 +669,7 @@ async def calculate_membership_extension(payment_amount: float) -> int:
 async def update_monthly_earnings(payment: dict):
     """Update monthly earnings when a payment is recorded"""
     try:
-        payment_date = payment['payment_date']
-        if isinstance(payment_date, str):
-            payment_date = datetime.fromisoformat(payment_date)
+        payment_date = to_utc_datetime(payment['payment_date'])
         
         year = payment_date.year
         month = payment_date.month
@@ -527,55 +677,35 @@ async def update_monthly_earnings(payment: dict):
         amount = payment['amount']
         method = payment['payment_method']
         
-        # Find or create monthly earnings record
-        earnings_query = {"year": year, "month": month}
-        existing_earnings = await db.monthly_earnings.find_one(earnings_query)
+        # Payment gateways other than cash, UPI and card count as online
+        category = {"cash": "cash", "upi": "upi", "card": "card"}.get(method, "online")
+        now = datetime.now(timezone.utc)
         
-        if existing_earnings:
-            # Update existing record
-            update_data = {
-                "total_earnings": existing_earnings["total_earnings"] + amount,
-                "total_payments": existing_earnings["total_payments"] + 1,
-                "updated_at": datetime.now(timezone.utc)
-            }
-            
-            # Update specific payment method earnings
-            if method == "cash":
-                update_data["cash_earnings"] = existing_earnings["cash_earnings"] + amount
-                update_data["cash_payments"] = existing_earnings["cash_payments"] + 1
-            elif method == "upi":
-                update_data["upi_earnings"] = existing_earnings["upi_earnings"] + amount
-                update_data["upi_payments"] = existing_earnings["upi_payments"] + 1
-            elif method == "card":
-                update_data["card_earnings"] = existing_earnings["card_earnings"] + amount
-                update_data["card_payments"] = existing_earnings["card_payments"] + 1
-            else:
-                # Online payment gateways
-                update_data["online_earnings"] = existing_earnings["online_earnings"] + amount
-                update_data["online_payments"] = existing_earnings["online_payments"] + 1
-            
-            await db.monthly_earnings.update_one(earnings_query, {"$set": update_data})
-        else:
-            # Create new record
-            earnings_data = {
-                "year": year,
-                "month": month,
-                "month_name": month_name,
-                "total_earnings": amount,
-                "cash_earnings": amount if method == "cash" else 0.0,
-                "upi_earnings": amount if method == "upi" else 0.0,
-                "card_earnings": amount if method == "card" else 0.0,
-                "online_earnings": amount if method not in ["cash", "upi", "card"] else 0.0,
-                "total_payments": 1,
-                "cash_payments": 1 if method == "cash" else 0,
-                "upi_payments": 1 if method == "upi" else 0,
-                "card_payments": 1 if method == "card" else 0,
-                "online_payments": 1 if method not in ["cash", "upi", "card"] else 0,
-                "created_at": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc)
-            }
-            
-            await db.monthly_earnings.insert_one(earnings_data)
+        # Increment or create the monthly earnings record in one atomic write
+        set_on_insert = {
+            "id": str(uuid.uuid4()),
+            "month_name": month_name,
+            "created_at": now
+        }
+        for other in ["cash", "upi", "card", "online"]:
+            if other != category:
+                set_on_insert[f"{other}_earnings"] = 0.0
+                set_on_insert[f"{other}_payments"] = 0
+        
+        await db.monthly_earnings.update_one(
+            {"year": year, "month": month},
+            {
+                "$inc": {
+                    "total_earnings": amount,
+                    "total_payments": 1,
+                    f"{category}_earnings": amount,
+                    f"{category}_payments": 1
+                },
+                "$set": {"updated_at": now},
+                "$setOnInsert": set_on_insert
+            },
+            upsert=True
+        )
         
         logger.info(f"Monthly earnings updated for {month_name} {year}: +₹{amount} ({method})")
         
@@ -593,6 +723,17 @@ async def get_payment_method_category(method: str) -> str:
     else:
         return "online"
 
+def membership_status_bucket(membership_end: datetime) -> str:
+    """Classify a membership end date into the bucket used by the member status filters"""
+    remaining = to_utc_datetime(membership_end) - datetime.now(timezone.utc)
+    if remaining < timedelta(0):
+        return "expired"
+    if remaining <= timedelta(days=7):
+        return "expiring_7days"
+    if remaining <= timedelta(days=30):
+        return "expiring_30days"
+    return "active"
+
 def calculate_membership_end_date(start_date: datetime, membership_type: MembershipType) -> datetime:
     """Calculate membership end date based on type"""
     duration_days = {
@@ -625,39 +766,35 @@ def calculate_enrollment_amount(membership_type: MembershipType, is_existing_mem
     
     return amounts[membership_type]["subsequent" if is_existing_member else "first"]
 
-def prepare_for_mongo(data: dict) -> dict:
-    """Prepare data for MongoDB storage"""
-    for key, value in data.items():
-        if isinstance(value, datetime):
-            data[key] = value.isoformat()
-    return data
+def to_utc_datetime(value):
+    """Normalize a stored datetime or legacy ISO string to an aware UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def trusted_list_response(docs: list, headers: Optional[dict] = None) -> ORJSONResponse:
+    """Serialize documents written by this API directly, skipping response_model validation.
+    
+    Returning a Response bypasses FastAPI's per-item validation while the route's
+    response_model still documents the schema; orjson encodes datetimes natively.
+    """
+    return ORJSONResponse([parse_from_mongo(doc) for doc in docs], headers=headers)
 
 def parse_from_mongo(item: dict) -> dict:
-    """Parse data from MongoDB"""
+    """Parse data from MongoDB in place, returning the same dict"""
     if item is None:
         return item
         
-    # Remove MongoDB ObjectId if present
-    if '_id' in item:
-        del item['_id']
-    
-    # Convert ObjectId to string if found in any field
-    for key, value in item.items():
-        if hasattr(value, '__class__') and value.__class__.__name__ == 'ObjectId':
-            item[key] = str(value)
+    # Remove MongoDB ObjectId if present; all other ids are stored as UUID strings
+    item.pop('_id', None)
     
-    # Parse dates
-    datetime_fields = ['join_date', 'membership_start', 'membership_end', 'created_at', 'updated_at', 'payment_date']
+    # Default missing dates for required fields
+    datetime_fields = ['join_date', 'membership_start', 'membership_end', 'created_at', 'updated_at']
     for field in datetime_fields:
-        if field in item and isinstance(item[field], str):
-            try:
-                item[field] = datetime.fromisoformat(item[field])
-            except ValueError:
-                pass
-        elif field in item and item[field] is None:
-            # Handle None values by setting a default datetime for required fields
-            if field in ['join_date', 'membership_start', 'membership_end', 'created_at', 'updated_at']:
-                item[field] = datetime.now(timezone.utc)
+        if field in item and item[field] is None:
+            item[field] = datetime.now(timezone.utc)
     
     return item
 
@@ -671,23 +808,23 @@ async def root():
 async def register_user(user_data: UserCreate, current_admin: User = Depends(require_admin_role)):
     try:
         # Check if username already exists
-        existing_user = await db.users.find_one({"username": user_data.username})
+        existing_user = await db.users.find_one({"username": user_data.username}, {"_id": 1})
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already registered")
         
         # Check if email already exists
-        existing_email = await db.users.find_one({"email": user_data.email})
+        existing_email = await db.users.find_one({"email": user_data.email}, {"_id": 1})
         if existing_email:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Hash password and create user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
         user = User(
-            **user_data.dict(exclude={'password'}),
+            **user_data.model_dump(exclude={'password'}),
             created_by=current_admin.username
         )
         
-        user_dict = prepare_for_mongo(user.dict())
+        user_dict = user.model_dump()
         user_dict['hashed_password'] = hashed_password
         
         await db.users.insert_one(user_dict)
@@ -695,12 +832,12 @@ async def register_user(user_data: UserCreate, current_admin: User = Depends(req
         # Update user permissions
         await update_user_permissions(user.id)
         
-        # Send notification
-        await send_system_notification(
+        # Send notification without delaying the response
+        run_in_background(send_system_notification(
             f"New user '{user.full_name}' added",
             f"User created with role: {user.role} by {current_admin.full_name}",
             "info"
-        )
+        ))
         
         return user
         
@@ -720,7 +857,7 @@ async def update_user(
         if current_admin.id == user_id and user_update.role != UserRole.ADMIN:
             raise HTTPException(status_code=400, detail="Cannot change your own admin role")
         
-        existing_user = await db.users.find_one({"id": user_id})
+        existing_user = await db.users.find_one({"id": user_id}, {"_id": 0, "username": 1, "email": 1})
         if not existing_user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -729,7 +866,7 @@ async def update_user(
             existing_username = await db.users.find_one({
                 "username": user_update.username,
                 "id": {"$ne": user_id}
-            })
+            }, {"_id": 1})
             if existing_username:
                 raise HTTPException(status_code=400, detail="Username already exists")
         
@@ -737,19 +874,17 @@ async def update_user(
             existing_email = await db.users.find_one({
                 "email": user_update.email,
                 "id": {"$ne": user_id}
-            })
+            }, {"_id": 1})
             if existing_email:
                 raise HTTPException(status_code=400, detail="Email already exists")
         
         # Update user data
-        update_data = user_update.dict(exclude={'password'})
+        update_data = user_update.model_dump(exclude={'password'})
         update_data['updated_at'] = datetime.now(timezone.utc)
         
         # Update password if provided
         if user_update.password:
-            update_data['hashed_password'] = get_password_hash(user_update.password)
-        
-        update_data = prepare_for_mongo(update_data)
+            update_data['hashed_password'] = await asyncio.to_thread(get_password_hash, user_update.password)
         
         await db.users.update_one(
             {"id": user_id},
@@ -759,15 +894,15 @@ async def update_user(
         # Update user permissions
         await update_user_permissions(user_id)
         
-        # Send notification
-        await send_system_notification(
+        # Send notification without delaying the response
+        run_in_background(send_system_notification(
             f"User '{user_update.full_name}' updated",
             f"User details updated by {current_admin.full_name}",
             "info"
-        )
+        ))
         
         # Get updated user
-        updated_user = await db.users.find_one({"id": user_id})
+        updated_user = await db.users.find_one({"id": user_id}, USER_PROJECTION)
         return User(**parse_from_mongo(updated_user))
         
     except HTTPException:
@@ -782,24 +917,24 @@ async def delete_user(user_id: str, current_admin: User = Depends(require_admin_
         if current_admin.id == user_id:
             raise HTTPException(status_code=400, detail="Cannot delete your own account")
         
-        user = await db.users.find_one({"id": user_id})
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "role": 1, "full_name": 1})
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Check if it's the last admin
+        # Check if it's the last admin; an indexed probe for any other admin instead of a count
         if user.get("role") == "admin":
-            admin_count = await db.users.count_documents({"role": "admin"})
-            if admin_count <= 1:
+            other_admin = await db.users.find_one({"role": "admin", "id": {"$ne": user_id}}, {"_id": 1})
+            if not other_admin:
                 raise HTTPException(status_code=400, detail="Cannot delete the last admin user")
         
         await db.users.delete_one({"id": user_id})
         
-        # Send notification
-        await send_system_notification(
+        # Send notification without delaying the response
+        run_in_background(send_system_notification(
             f"User '{user['full_name']}' deleted",
             f"User account deleted by {current_admin.full_name}",
             "warning"
-        )
+        ))
         
         return {"message": f"User {user['full_name']} deleted successfully"}
         
@@ -811,8 +946,12 @@ async def delete_user(user_id: str, current_admin: User = Depends(require_admin_
 @api_router.post("/auth/login", response_model=Token)
 async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
     try:
-        user = await db.users.find_one({"username": form_data.username})
-        if not user or not verify_password(form_data.password, user.get('hashed_password')):
+        user = await db.users.find_one(
+            {"username": form_data.username},
+            {**USER_PROJECTION, "hashed_password": 1}
+        )
+        # Key derivation is CPU-bound, so run it off the event loop
+        if not user or not await asyncio.to_thread(verify_password, form_data.password, user.get('hashed_password')):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
@@ -822,17 +961,22 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
         if not user.get('is_active', True):
             raise HTTPException(status_code=400, detail="Inactive user")
         
-        # Update last login time and refresh permissions
-        await db.users.update_one(
-            {"id": user["id"]},
-            {"$set": {"last_login": datetime.now(timezone.utc)}}
-        )
+        # Update last login time and refresh permissions in one write that returns the updated user
+        login_update = {
+            "last_login": datetime.now(timezone.utc),
+            "permissions": await compute_permissions(user)
+        }
         
-        # Refresh user permissions
-        await update_user_permissions(user["id"])
+        # Upgrade legacy password hashes while the plain password is available
+        if password_needs_rehash(user['hashed_password']):
+            login_update['hashed_password'] = await asyncio.to_thread(get_password_hash, form_data.password)
         
-        # Get updated user data
-        updated_user = await db.users.find_one({"id": user["id"]})
+        updated_user = await db.users.find_one_and_update(
+            {"id": user["id"]},
+            {"$set": login_update},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
         
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
@@ -843,7 +987,7 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
         return {
             "access_token": access_token,
             "token_type": "bearer",
-            "user": user_data.dict(exclude={'hashed_password'})
+            "user": user_data.model_dump(exclude={'hashed_password'})
         }
         
     except HTTPException:
@@ -858,17 +1002,24 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
 @api_router.get("/users", response_model=List[User])
 async def get_all_users(current_user: User = Depends(require_permission("users", "read"))):
     try:
-        users = await db.users.find().to_list(None)  # No limit on users
-        return [User(**parse_from_mongo(user)) for user in users]
+        users = await db.users.find({}, USER_PROJECTION).to_list(None)  # No limit on users
+        return trusted_list_response(users)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Role Management Routes
 @api_router.get("/roles", response_model=List[CustomRole])
-async def get_roles(current_user: User = Depends(require_permission("roles", "read"))):
+async def get_roles(
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: User = Depends(require_permission("roles", "read"))
+):
     try:
-        roles = await db.custom_roles.find().to_list(1000)
-        return [CustomRole(**parse_from_mongo(role)) for role in roles]
+        sort = [("_id", 1)]
+        roles = await db.custom_roles.find(keyset_filter(sort, after)).sort(sort).limit(limit).to_list(limit)
+        return trusted_list_response(roles, next_cursor_headers(roles, sort, limit))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -884,19 +1035,19 @@ async def create_role(
             raise HTTPException(status_code=400, detail="Role name already exists")
         
         role = CustomRole(
-            **role_data.dict(),
+            **role_data.model_dump(),
             created_by=current_user.username
         )
         
-        role_dict = prepare_for_mongo(role.dict())
+        role_dict = role.model_dump()
         await db.custom_roles.insert_one(role_dict)
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             f"New role '{role.name}' created",
             f"Role created by {current_user.full_name}",
             "info"
-        )
+        ))
         
         return role
         
@@ -912,26 +1063,20 @@ async def update_role(
     current_user: User = Depends(require_permission("roles", "write"))
 ):
     try:
-        existing_role = await db.custom_roles.find_one({"id": role_id})
-        if not existing_role:
-            raise HTTPException(status_code=404, detail="Role not found")
-        
-        update_data = {k: v for k, v in role_update.dict().items() if v is not None}
+        update_data = {k: v for k, v in role_update.model_dump().items() if v is not None}
         update_data['updated_at'] = datetime.now(timezone.utc)
         
-        update_data = prepare_for_mongo(update_data)
-        
-        await db.custom_roles.update_one(
+        updated_role = await db.custom_roles.find_one_and_update(
             {"id": role_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
+        if not updated_role:
+            raise HTTPException(status_code=404, detail="Role not found")
         
         # Update permissions for all users with this role
-        users_with_role = await db.users.find({"custom_role_id": role_id}).to_list(1000)
-        for user in users_with_role:
-            await update_user_permissions(user["id"])
+        await update_role_users_permissions(role_id)
         
-        updated_role = await db.custom_roles.find_one({"id": role_id})
         return CustomRole(**parse_from_mongo(updated_role))
         
     except HTTPException:
@@ -945,9 +1090,9 @@ async def delete_role(
     current_user: User = Depends(require_permission("roles", "delete"))
 ):
     try:
-        # Check if any users have this role
-        users_with_role = await db.users.count_documents({"custom_role_id": role_id})
-        if users_with_role > 0:
+        # Check if any users have this role; an indexed existence probe, counting only to report the failure
+        if await db.users.find_one({"custom_role_id": role_id}, {"_id": 1}):
+            users_with_role = await db.users.count_documents({"custom_role_id": role_id})
             raise HTTPException(
                 status_code=400, 
                 detail=f"Cannot delete role. {users_with_role} users currently have this role."
@@ -965,10 +1110,19 @@ async def delete_role(
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/permissions", response_model=List[Permission])
-async def get_permissions(current_user: User = Depends(require_permission("roles", "read"))):
+async def get_permissions(
+    response: Response,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: User = Depends(require_permission("roles", "read"))
+):
     try:
-        permissions = await db.permissions.find().to_list(1000)
-        return [Permission(**parse_from_mongo(perm)) for perm in permissions]
+        sort = [("_id", 1)]
+        permissions = await db.permissions.find(keyset_filter(sort, after)).sort(sort).limit(limit).to_list(limit)
+        response.headers.update(next_cursor_headers(permissions, sort, limit))
+        return permission_list_adapter.validate_python([parse_from_mongo(perm) for perm in permissions])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1001,7 +1155,7 @@ async def create_member(member_data: MemberCreate, current_user: User = Depends(
         total_due = enrollment_amount
         
         member = Member(
-            **member_data.dict(exclude={'join_date'}),
+            **member_data.model_dump(exclude={'join_date'}),
             join_date=join_date,
             membership_start=join_date,
             membership_end=membership_end,
@@ -1011,7 +1165,8 @@ async def create_member(member_data: MemberCreate, current_user: User = Depends(
         )
         
         # Prepare for MongoDB storage
-        member_dict = prepare_for_mongo(member.dict())
+        member_dict = member.model_dump()
+        member_dict['status_bucket'] = membership_status_bucket(member.membership_end)
         await db.members.insert_one(member_dict)
         
         # Create initial enrollment payment record (pending)
@@ -1024,100 +1179,71 @@ async def create_member(member_data: MemberCreate, current_user: User = Depends(
         )
         
         # Mark payment as pending initially
-        payment_dict = prepare_for_mongo(payment_record.dict())
+        payment_dict = payment_record.model_dump()
         payment_dict["status"] = "pending"  # This payment needs to be collected
         await db.payments.insert_one(payment_dict)
+        invalidate_dashboard_stats()
         
         # Send notification with enrollment amount details
         amount_breakdown = f"₹{enrollment_amount}"
         if admission_fee > 0:
             amount_breakdown += f" (₹{admission_fee} admission + ₹{membership_fee} membership)"
         
-        await send_system_notification(
+        run_in_background(send_system_notification(
             f"New member '{member.name}' added - Payment Pending",
             f"Membership: {member_data.membership_type.value} | Start: {join_date.strftime('%Y-%m-%d')} | Amount due: {amount_breakdown}",
             "warning"  # Warning to indicate payment is pending
-        )
+        ))
         
         return member
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Member list filters; expiry is matched on the status_bucket kept current by the membership sweep
+MEMBER_STATUS_QUERIES = {
+    # Active members: paid and membership not expired
+    "active": {
+        "current_payment_status": {"$in": ["paid", "active"]},
+        "status_bucket": {"$in": ["expiring_7days", "expiring_30days", "active"]}
+    },
+    # Expired members: membership end date has passed
+    "expired": {"status_bucket": "expired"},
+    # Members expiring within 7 days
+    "expiring_7days": {"status_bucket": "expiring_7days"},
+    # Members expiring within 30 days
+    "expiring_30days": {"status_bucket": {"$in": ["expiring_7days", "expiring_30days"]}},
+    "inactive": {"current_payment_status": {"$in": ["unpaid", "inactive", "suspended"]}},
+    "pending": {"current_payment_status": "pending"},
+}
+
 @api_router.get("/members", response_model=List[Member])
 async def get_members(
     status: Optional[str] = None, 
     current_user: User = Depends(get_current_active_user)
 ):
     try:
-        query = {}
         current_time = datetime.now(timezone.utc)
+        query = MEMBER_STATUS_QUERIES.get(status, {})
         
-        # Filter by status if provided
-        if status:
-            if status == "active":
-                # Active members: paid and membership not expired
-                query["$and"] = [
-                    {"current_payment_status": {"$in": ["paid", "active"]}},
-                    {"membership_end": {"$gt": current_time.isoformat()}}
-                ]
-            elif status == "expired":
-                # Expired members: membership end date has passed
-                query["membership_end"] = {"$lt": current_time.isoformat()}
-            elif status == "expiring_7days":
-                # Members expiring within 7 days
-                seven_days_from_now = current_time + timedelta(days=7)
-                query["$and"] = [
-                    {"membership_end": {"$gt": current_time.isoformat()}},
-                    {"membership_end": {"$lte": seven_days_from_now.isoformat()}}
-                ]
-            elif status == "expiring_30days":
-                # Members expiring within 30 days
-                thirty_days_from_now = current_time + timedelta(days=30)
-                query["$and"] = [
-                    {"membership_end": {"$gt": current_time.isoformat()}},
-                    {"membership_end": {"$lte": thirty_days_from_now.isoformat()}}
-                ]
-            elif status == "inactive":
-                query["current_payment_status"] = {"$in": ["unpaid", "inactive", "suspended"]}
-            elif status == "pending":
-                query["current_payment_status"] = "pending"
-        
-        members = await db.members.find(query).to_list(1000)
+        cursor = db.members.find(query, MEMBER_PROJECTION).limit(MAX_PAGE_SIZE).batch_size(CURSOR_BATCH_SIZE)
         
-        # Update member status based on expiry for all members
+        # Reflect expiry in the response; the membership sweep persists status changes
         updated_members = []
-        for member in members:
+        async for member in cursor:
             # Clean MongoDB document
-            member_obj = parse_from_mongo(member.copy())
+            member_obj = parse_from_mongo(member)
             
             # Check if member is expired
             if member_obj.get('membership_end'):
                 try:
-                    if isinstance(member_obj['membership_end'], str):
-                        membership_end = datetime.fromisoformat(member_obj['membership_end'])
-                    else:
-                        membership_end = member_obj['membership_end']
+                    membership_end = to_utc_datetime(member_obj['membership_end'])
                         
                     if membership_end < current_time:
-                        # Member is expired - update status to expired and inactive
-                        await db.members.update_one(
-                            {"id": member_obj['id']},
-                            {"$set": {
-                                "current_payment_status": "expired",
-                                "member_status": "inactive"
-                            }}
-                        )
+                        # Member is expired - show as expired and inactive
                         member_obj['current_payment_status'] = "expired"
                         member_obj['member_status'] = "inactive"
                     elif member_obj.get('current_payment_status') == 'expired' and membership_end > current_time:
-                        # Member was expired but now has valid membership - reactivate
-                        await db.members.update_one(
-                            {"id": member_obj['id']},
-                            {"$set": {
-                                "current_payment_status": "paid",
-                                "member_status": "active"
-                            }}
-                        )
+                        # Member was expired but now has valid membership - show as reactivated
                         member_obj['current_payment_status'] = "paid"
                         member_obj['member_status'] = "active"
                 except (ValueError, TypeError):
@@ -1149,16 +1275,13 @@ async def get_members(
 async def get_expiring_members(days: int = 7):
     try:
         expiry_date = datetime.now(timezone.utc) + timedelta(days=days)
-        members = await db.members.find({
-            "membership_end": {"$lte": expiry_date.isoformat()}
-        }).to_list(1000)
+        cursor = db.members.find({
+            "membership_end": {"$lte": expiry_date}
+        }, MEMBER_PROJECTION).limit(MAX_PAGE_SIZE).batch_size(CURSOR_BATCH_SIZE)
         
-        if not members:
-            return []
-            
         # Parse members carefully
         parsed_members = []
-        for member in members:
+        async for member in cursor:
             try:
                 parsed_member = parse_from_mongo(member)
                 parsed_members.append(Member(**parsed_member))
@@ -1171,13 +1294,80 @@ async def get_expiring_members(days: int = 7):
         logger.error(f"Error fetching expiring members: {e}")
         return []  # Return empty list instead of raising exception
 
+class MemberLoader:
+    """Coalesces concurrent single-member lookups into one $in query.
+    
+    Lookups issued while a batch is pending share the next dispatch, so a burst
+    of GET /members/{id} calls costs one round trip instead of one each.
+    """
+    
+    def __init__(self):
+        self.pending = {}
+        self.dispatch_task = None
+    
+    def load(self, member_id: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(member_id, []).append(future)
+        if self.dispatch_task is None:
+            self.dispatch_task = run_in_background(self.dispatch())
+        return future
+    
+    async def dispatch(self):
+        batch, self.pending, self.dispatch_task = self.pending, {}, None
+        try:
+            docs = await db.members.find({"id": {"$in": list(batch)}}, MEMBER_PROJECTION).to_list(len(batch))
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        
+        docs_by_id = {doc["id"]: doc for doc in docs}
+        for member_id, futures in batch.items():
+            doc = docs_by_id.get(member_id)
+            for future in futures:
+                if not future.done():
+                    future.set_result(dict(doc) if doc else None)
+
+member_loader = MemberLoader()
+
 @api_router.get("/members/{member_id}", response_model=Member)
 async def get_member(member_id: str):
     try:
-        member = await db.members.find_one({"id": member_id})
+        member = await member_loader.load(member_id)
         if not member:
             raise HTTPException(status_code=404, detail="Member not found")
         return Member(**parse_from_mongo(member))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/members/{member_id}/details", response_model=MemberDetails)
+async def get_member_details(member_id: str):
+    """Get a member together with their payments in one round trip"""
+    try:
+        # Join payments server-side using the payments.member_id index
+        result = await db.members.aggregate([
+            {"$match": {"id": member_id}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": "payments",
+                "localField": "id",
+                "foreignField": "member_id",
+                "as": "payments"
+            }},
+            {"$project": {"_id": 0, "payments._id": 0}}
+        ]).to_list(1)
+        if not result:
+            raise HTTPException(status_code=404, detail="Member not found")
+        
+        member = parse_from_mongo(result[0])
+        member["payments"].sort(key=lambda payment: payment.get("payment_date") or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
+        return MemberDetails(**member)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1193,13 +1383,11 @@ async def update_member(
             raise HTTPException(status_code=404, detail="Member not found")
         
         # Update member data
-        update_data = member_update.dict()
+        update_data = member_update.model_dump()
         update_data['updated_at'] = datetime.now(timezone.utc)
         
         # Handle join_date changes (including backdating)
-        new_join_date = member_update.join_date or existing_member.get('join_date')
-        if isinstance(new_join_date, str):
-            new_join_date = datetime.fromisoformat(new_join_date)
+        new_join_date = to_utc_datetime(member_update.join_date or existing_member.get('join_date'))
         
         update_data['join_date'] = new_join_date
         update_data['membership_start'] = new_join_date
@@ -1207,6 +1395,7 @@ async def update_member(
         # Recalculate membership end date if join date or membership type changed
         new_membership_end = calculate_membership_end_date(new_join_date, member_update.membership_type)
         update_data['membership_end'] = new_membership_end
+        update_data['status_bucket'] = membership_status_bucket(new_membership_end)
         
         # Recalculate fees if membership type changed
         membership_fee = await calculate_membership_fee(member_update.membership_type)
@@ -1233,24 +1422,27 @@ async def update_member(
         update_data['admission_fee_amount'] = admission_fee
         update_data['total_amount_due'] = admission_fee + membership_fee
         
-        # Prepare for MongoDB
-        update_data = prepare_for_mongo(update_data)
-        
-        await db.members.update_one(
+        # Update and read back the member in one round trip
+        updated_member = await db.members.find_one_and_update(
             {"id": member_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection=MEMBER_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
+        if not updated_member:
+            raise HTTPException(status_code=404, detail="Member not found")
+        invalidate_dashboard_stats()
         
         # Send notification about member update
-        await send_system_notification(
+        run_in_background(send_system_notification(
             f"Member '{existing_member.get('name')}' updated",
             f"Updated by {current_user.full_name} | Type: {member_update.membership_type.value} | Start: {new_join_date.strftime('%Y-%m-%d')}",
             "info"
-        )
+        ))
         
-        # Get updated member
-        updated_member = await db.members.find_one({"id": member_id})
         return Member(**parse_from_mongo(updated_member))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1273,7 +1465,7 @@ async def update_member_start_date(
         # Parse the new start date
         if isinstance(new_start_date, str):
             try:
-                new_start_date = datetime.fromisoformat(new_start_date.replace('Z', '+00:00'))
+                new_start_date = to_utc_datetime(new_start_date)
             except ValueError:
                 raise HTTPException(status_code=400, detail="Invalid date format")
         
@@ -1285,31 +1477,33 @@ async def update_member_start_date(
         
         # Update member record
         update_data = {
-            'join_date': new_start_date.isoformat(),
-            'membership_start': new_start_date.isoformat(),
-            'membership_end': new_end_date.isoformat(),
-            'updated_at': datetime.now(timezone.utc).isoformat()
+            'join_date': new_start_date,
+            'membership_start': new_start_date,
+            'membership_end': new_end_date,
+            'status_bucket': membership_status_bucket(new_end_date),
+            'updated_at': datetime.now(timezone.utc)
         }
         
         await db.members.update_one(
             {"id": member_id},
             {"$set": update_data}
         )
+        invalidate_dashboard_stats()
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Member start date updated",
             f"'{existing_member.get('name')}' start date changed to {new_start_date.strftime('%Y-%m-%d')} by {current_user.full_name}",
             "info"
-        )
+        ))
         
-        return {
+        return ORJSONResponse({
             "message": "Member start date updated successfully",
             "member_id": member_id,
             "old_start_date": existing_member.get('join_date'),
-            "new_start_date": new_start_date.isoformat(),
-            "new_end_date": new_end_date.isoformat()
-        }
+            "new_start_date": new_start_date,
+            "new_end_date": new_end_date
+        })
         
     except HTTPException:
         raise
@@ -1324,20 +1518,22 @@ async def update_member_end_date(
 ):
     """Update member's membership end date directly and update status"""
     try:
-        existing_member = await db.members.find_one({"id": member_id})
-        if not existing_member:
-            raise HTTPException(status_code=404, detail="Member not found")
-        
         new_end_date = date_data.get("end_date")
+        date_error = None
         if not new_end_date:
-            raise HTTPException(status_code=400, detail="End date is required")
-        
-        # Parse the new end date
-        if isinstance(new_end_date, str):
+            date_error = "End date is required"
+        elif isinstance(new_end_date, str):
+            # Parse the new end date
             try:
-                new_end_date = datetime.fromisoformat(new_end_date.replace('Z', '+00:00'))
+                new_end_date = to_utc_datetime(new_end_date)
             except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date format")
+                date_error = "Invalid date format"
+        
+        # A missing member is reported before a bad date; the probe only runs for bad input
+        if date_error:
+            if not await db.members.find_one({"id": member_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Member not found")
+            raise HTTPException(status_code=400, detail=date_error)
         
         # Determine new status based on end date
         current_time = datetime.now(timezone.utc)
@@ -1352,33 +1548,40 @@ async def update_member_end_date(
         
         # Update member record with new end date and status
         update_data = {
-            'membership_end': new_end_date.isoformat(),
+            'membership_end': new_end_date,
+            'status_bucket': membership_status_bucket(new_end_date),
             'current_payment_status': new_payment_status,
             'member_status': new_member_status,
-            'updated_at': datetime.now(timezone.utc).isoformat()
+            'updated_at': current_time
         }
         
-        await db.members.update_one(
+        # Update and read the previous end date in one round trip
+        existing_member = await db.members.find_one_and_update(
             {"id": member_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"_id": 0, "name": 1, "membership_end": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if not existing_member:
+            raise HTTPException(status_code=404, detail="Member not found")
+        invalidate_dashboard_stats()
         
         # Send notification with status change
         status_text = "ACTIVE" if new_payment_status == "paid" else "EXPIRED"
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Member end date updated",
             f"'{existing_member.get('name')}' membership end date changed to {new_end_date.strftime('%Y-%m-%d')} by {current_user.full_name}. Status: {status_text}",
             "info"
-        )
+        ))
         
-        return {
+        return ORJSONResponse({
             "message": "Member end date and status updated successfully",
             "member_id": member_id,
             "old_end_date": existing_member.get('membership_end'),
-            "new_end_date": new_end_date.isoformat(),
+            "new_end_date": new_end_date,
             "new_status": new_payment_status,
             "member_status": new_member_status
-        }
+        })
         
     except HTTPException:
         raise
@@ -1402,13 +1605,14 @@ async def delete_member(member_id: str, current_user: User = Depends(get_current
         
         # Delete the member
         await db.members.delete_one({"id": member_id})
+        invalidate_dashboard_stats()
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             f"Member '{member['name']}' deleted",
             f"Member deleted by {current_user.full_name}",
             "warning"
-        )
+        ))
         
         return {"message": f"Member '{member['name']}' deleted successfully"}
         
@@ -1432,18 +1636,19 @@ async def bulk_delete_members(
             raise HTTPException(status_code=400, detail="Cannot delete more than 100 members at once")
         
         # Get member names for notification
-        members = await db.members.find({"id": {"$in": member_ids}}).to_list(1000)
+        members = await db.members.find({"id": {"$in": member_ids}}, {"_id": 0, "name": 1}).to_list(len(member_ids))
         member_names = [member.get("name", "Unknown") for member in members]
         
         # Delete members
         result = await db.members.delete_many({"id": {"$in": member_ids}})
+        invalidate_dashboard_stats()
         
-        # Send notification
-        await send_system_notification(
+        # Send notification without delaying the response
+        run_in_background(send_system_notification(
             f"Bulk delete: {result.deleted_count} members",
             f"Members deleted: {', '.join(member_names[:5])}{'...' if len(member_names) > 5 else ''} by {current_admin.full_name}",
             "warning"
-        )
+        ))
         
         return {
             "message": f"Successfully deleted {result.deleted_count} members",
@@ -1471,9 +1676,10 @@ async def update_member_status(
             {"id": member_id},
             {"$set": {
                 "member_status": status.value,
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }}
         )
+        invalidate_dashboard_stats()
         
         return {"message": f"Member status updated to {status.value}"}
         
@@ -1486,22 +1692,19 @@ async def update_member_status(
 @api_router.post("/payments", response_model=PaymentRecord)
 async def record_payment(payment_data: PaymentCreate):
     try:
-        # Check if member exists
-        member = await db.members.find_one({"id": payment_data.member_id})
-        if not member:
+        # Check if member exists and get the fields needed for the renewal
+        current_member = await db.members.find_one(
+            {"id": payment_data.member_id},
+            {"_id": 0, "name": 1, "membership_end": 1}
+        )
+        if not current_member:
             raise HTTPException(status_code=404, detail="Member not found")
         
-        # Create payment record
-        payment = PaymentRecord(**payment_data.dict())
-        payment_dict = prepare_for_mongo(payment.dict())
+        # Create payment record first, so earnings and the renewal only follow a stored payment
+        payment = PaymentRecord(**payment_data.model_dump())
+        payment_dict = payment.model_dump()
         await db.payments.insert_one(payment_dict)
         
-        # Update monthly earnings
-        await update_monthly_earnings(payment_dict)
-        
-        # Get current member data
-        current_member = await db.members.find_one({"id": payment_data.member_id})
-        
         # Calculate membership extension based on specific payment amounts
         extension_days = 0
         if payment.amount == 1000:
@@ -1515,65 +1718,89 @@ async def record_payment(payment_data: PaymentCreate):
             extension_days = await calculate_membership_extension(payment.amount)
         
         # Determine renewal date and new expiry date
+        now = datetime.now(timezone.utc)
         if current_member and current_member.get('membership_end'):
             try:
-                existing_end_date = datetime.fromisoformat(current_member['membership_end'])
+                existing_end_date = to_utc_datetime(current_member['membership_end'])
                 # Always use the previous expiry date as the renewal start date
                 membership_start_date = existing_end_date
                 current_end_date = existing_end_date
             except (ValueError, TypeError):
                 # Fallback if date parsing fails
-                membership_start_date = datetime.now(timezone.utc)
-                current_end_date = datetime.now(timezone.utc)
+                membership_start_date = now
+                current_end_date = now
         else:
             # New member case
-            membership_start_date = datetime.now(timezone.utc)
-            current_end_date = datetime.now(timezone.utc)
+            membership_start_date = now
+            current_end_date = now
         
         # Calculate new expiry date
         new_expiry_date = current_end_date + timedelta(days=extension_days)
         
-        # Update member status, expiry, and membership start date
-        await db.members.update_one(
-            {"id": payment_data.member_id},
-            {"$set": {
-                "current_payment_status": "paid",
-                "member_status": "active",
-                "membership_start": membership_start_date.isoformat(),
-                "membership_end": new_expiry_date.isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
+        # Update monthly earnings and member status, expiry, and membership start date concurrently
+        await asyncio.gather(
+            update_monthly_earnings(payment_dict),
+            db.members.update_one(
+                {"id": payment_data.member_id},
+                {"$set": {
+                    "current_payment_status": "paid",
+                    "member_status": "active",
+                    "membership_start": membership_start_date,
+                    "membership_end": new_expiry_date,
+                    "status_bucket": membership_status_bucket(new_expiry_date),
+                    "updated_at": now
+                }}
+            )
         )
+        invalidate_dashboard_stats()
         
         # Send notification with extension details
         member_name = current_member.get('name', 'Unknown') if current_member else 'Unknown'
-        await send_system_notification(
+        run_in_background(send_system_notification(
             f"Payment recorded: ₹{payment.amount}",
             f"Payment of ₹{payment.amount} recorded for {member_name}. Membership extended by {extension_days} days until {new_expiry_date.strftime('%Y-%m-%d')}",
             "info"
-        )
+        ))
         
         return payment
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.get("/payments/{member_id}", response_model=List[PaymentRecord])
-async def get_member_payments(member_id: str):
+async def get_member_payments(
+    member_id: str,
+    response: Response,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
     try:
-        payments = await db.payments.find({"member_id": member_id}).to_list(1000)
-        return [PaymentRecord(**parse_from_mongo(payment)) for payment in payments]
+        sort = [("_id", 1)]
+        query = {"member_id": member_id, **keyset_filter(sort, after)}
+        payments = await db.payments.find(query).sort(sort).limit(limit).to_list(limit)
+        response.headers.update(next_cursor_headers(payments, sort, limit))
+        return payment_record_list_adapter.validate_python([parse_from_mongo(payment) for payment in payments])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/payments")
-async def get_all_payments():
+async def get_all_payments(
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
     try:
-        payments = await db.payments.find().sort("payment_date", -1).to_list(1000)
+        sort = [("payment_date", -1), ("id", -1)]
+        cursor = db.payments.find(keyset_filter(sort, after), {"_id": 0}).sort(sort).limit(limit).batch_size(CURSOR_BATCH_SIZE)
+        
+        # Read the cursor before cleaning, which fills defaults into the same dicts
+        payments = await cursor.to_list(None)
+        headers = next_cursor_headers(payments, sort, limit)
         
         # Clean payments data for serialization
         cleaned_payments = []
         for payment in payments:
-            cleaned_payment = parse_from_mongo(payment.copy())
+            cleaned_payment = parse_from_mongo(payment)
             # Ensure required fields exist
             cleaned_payment.setdefault('id', str(uuid.uuid4()))
             cleaned_payment.setdefault('member_id', '')
@@ -1583,7 +1810,10 @@ async def get_all_payments():
             
             cleaned_payments.append(cleaned_payment)
         
-        return cleaned_payments
+        # Encode with orjson directly instead of running jsonable_encoder over the dicts
+        return ORJSONResponse(cleaned_payments, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching payments: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1592,6 +1822,8 @@ async def get_all_payments():
 @api_router.get("/earnings/monthly", response_model=List[MonthlyEarnings])
 async def get_monthly_earnings(
     year: Optional[int] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     current_user: User = Depends(get_current_active_user)
 ):
     """Get monthly earnings data, optionally filtered by year"""
@@ -1600,8 +1832,13 @@ async def get_monthly_earnings(
         if year:
             query["year"] = year
         
-        earnings = await db.monthly_earnings.find(query).sort([("year", -1), ("month", -1)]).to_list(1000)
-        return [MonthlyEarnings(**parse_from_mongo(earning)) for earning in earnings]
+        sort = [("year", -1), ("month", -1)]
+        query.update(keyset_filter(sort, after))
+        cursor = db.monthly_earnings.find(query, {"_id": 0}).sort(sort).limit(limit).batch_size(CURSOR_BATCH_SIZE)
+        earnings = [earning async for earning in cursor]
+        return trusted_list_response(earnings, next_cursor_headers(earnings, sort, limit))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1631,35 +1868,57 @@ async def get_monthly_earning_detail(
 async def get_earnings_summary(current_user: User = Depends(get_current_active_user)):
     """Get earnings summary with totals and trends"""
     try:
-        # Get current year earnings
-        current_year = datetime.now(timezone.utc).year
-        yearly_earnings = await db.monthly_earnings.find({"year": current_year}).to_list(1000)
-        
-        # Calculate totals
-        total_yearly = sum(earning.get("total_earnings", 0) for earning in yearly_earnings)
-        total_cash = sum(earning.get("cash_earnings", 0) for earning in yearly_earnings)
-        total_upi = sum(earning.get("upi_earnings", 0) for earning in yearly_earnings)
-        total_card = sum(earning.get("card_earnings", 0) for earning in yearly_earnings)
-        total_online = sum(earning.get("online_earnings", 0) for earning in yearly_earnings)
-        
-        # Get current month earnings
-        current_month = datetime.now(timezone.utc).month
-        current_month_earning = await db.monthly_earnings.find_one({
-            "year": current_year,
-            "month": current_month
-        })
-        
-        current_month_total = current_month_earning.get("total_earnings", 0) if current_month_earning else 0
+        now = datetime.now(timezone.utc)
+        current_year = now.year
+        current_month = now.month
         
-        # Get previous month for comparison
+        # Previous month for comparison
         prev_month = current_month - 1 if current_month > 1 else 12
         prev_year = current_year if current_month > 1 else current_year - 1
         
-        prev_month_earning = await db.monthly_earnings.find_one({
-            "year": prev_year,
-            "month": prev_month
-        })
+        # Get yearly totals, monthly records and the previous month in one round trip;
+        # the leading $match uses the (year, month) index before $facet splits the results
+        result = await db.monthly_earnings.aggregate([
+            {"$match": {"$or": [
+                {"year": current_year},
+                {"year": prev_year, "month": prev_month}
+            ]}},
+            {"$facet": {
+                "totals": [
+                    {"$match": {"year": current_year}},
+                    {"$group": {
+                        "_id": None,
+                        "total_yearly": {"$sum": "$total_earnings"},
+                        "total_cash": {"$sum": "$cash_earnings"},
+                        "total_upi": {"$sum": "$upi_earnings"},
+                        "total_card": {"$sum": "$card_earnings"},
+                        "total_online": {"$sum": "$online_earnings"}
+                    }}
+                ],
+                "yearly_earnings": [
+                    {"$match": {"year": current_year}},
+                    {"$project": {"_id": 0}}
+                ],
+                "prev_month": [
+                    {"$match": {"year": prev_year, "month": prev_month}},
+                    {"$project": {"_id": 0, "total_earnings": 1}}
+                ]
+            }}
+        ]).to_list(1)
+        
+        facets = result[0]
+        totals = facets["totals"][0] if facets["totals"] else {}
+        total_yearly = totals.get("total_yearly", 0)
+        total_cash = totals.get("total_cash", 0)
+        total_upi = totals.get("total_upi", 0)
+        total_card = totals.get("total_card", 0)
+        total_online = totals.get("total_online", 0)
+        
+        yearly_earnings = facets["yearly_earnings"]
+        current_month_earning = next((e for e in yearly_earnings if e.get("month") == current_month), None)
+        current_month_total = current_month_earning.get("total_earnings", 0) if current_month_earning else 0
         
+        prev_month_earning = facets["prev_month"][0] if facets["prev_month"] else None
         prev_month_total = prev_month_earning.get("total_earnings", 0) if prev_month_earning else 0
         
         # Calculate growth percentage
@@ -1667,7 +1926,8 @@ async def get_earnings_summary(current_user: User = Depends(get_current_active_u
         if prev_month_total > 0:
             growth_percentage = ((current_month_total - prev_month_total) / prev_month_total) * 100
         
-        return {
+        # Month records are written by this API; orjson encodes them without per-row validation
+        return ORJSONResponse({
             "current_year": current_year,
             "yearly_total": total_yearly,
             "current_month_total": current_month_total,
@@ -1679,46 +1939,67 @@ async def get_earnings_summary(current_user: User = Depends(get_current_active_u
                 "card": total_card,
                 "online": total_online
             },
-            "monthly_data": [MonthlyEarnings(**parse_from_mongo(earning)) for earning in yearly_earnings]
-        }
+            "monthly_data": yearly_earnings
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Dashboard Stats Route
+DASHBOARD_CACHE_TTL = 60  # seconds; member and payment writes invalidate it sooner
+dashboard_cache = TTLCache(DASHBOARD_CACHE_TTL)
+
+def invalidate_dashboard_stats():
+    """Drop the cached dashboard stats after a member or payment write"""
+    dashboard_cache.invalidate("stats")
+
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats():
     try:
-        total_members = await db.members.count_documents({})
-        active_members = await db.members.count_documents({"current_payment_status": "paid"})
-        pending_members = await db.members.count_documents({"current_payment_status": "pending"})
-        overdue_members = await db.members.count_documents({"current_payment_status": "overdue"})
-        
-        # Calculate expiring memberships (next 7 days)
-        next_week = datetime.now(timezone.utc) + timedelta(days=7)
-        expiring_soon = await db.members.count_documents({
-            "membership_end": {"$lte": next_week.isoformat()},
-            "current_payment_status": {"$ne": "expired"}
-        })
-        
-        # Calculate total revenue this month
-        start_of_month = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0)
-        monthly_payments = await db.payments.find({
-            "payment_date": {"$gte": start_of_month.isoformat()}
-        }).to_list(1000)
-        
-        monthly_revenue = sum(payment.get('amount', 0) for payment in monthly_payments)
-        
-        return {
-            "total_members": total_members,
-            "active_members": active_members,
-            "pending_members": pending_members,
-            "overdue_members": overdue_members,
-            "expiring_soon": expiring_soon,
-            "monthly_revenue": monthly_revenue
-        }
+        return await dashboard_cache.get("stats", compute_dashboard_stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def compute_dashboard_stats() -> dict:
+    """Compute the member and revenue figures shown on the dashboard"""
+    current_time = datetime.now(timezone.utc)
+    next_week = current_time + timedelta(days=7)
+    start_of_month = current_time.replace(day=1, hour=0, minute=0, second=0)
+    
+    # Member counts, expiring members and this month's revenue are independent; run them concurrently
+    status_groups, expiring_soon, revenue = await asyncio.gather(
+        # Count members per payment status
+        db.members.aggregate([
+            {"$group": {"_id": "$current_payment_status", "count": {"$sum": 1}}}
+        ]).to_list(None),
+        # Count members expiring in the next 7 days as its own query; a $facet branch cannot use an index
+        db.members.count_documents({
+            "membership_end": {"$lte": next_week},
+            "current_payment_status": {"$ne": "expired"}
+        }),
+        # Calculate total revenue this month
+        db.payments.aggregate([
+            {"$match": {"payment_date": {"$gte": start_of_month}}},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+        ]).to_list(1)
+    )
+    
+    status_counts = {group["_id"]: group["count"] for group in status_groups}
+    total_members = sum(status_counts.values())
+    active_members = status_counts.get("paid", 0)
+    pending_members = status_counts.get("pending", 0)
+    overdue_members = status_counts.get("overdue", 0)
+    monthly_revenue = revenue[0]["total"] if revenue else 0
+    
+    stats = {
+        "total_members": total_members,
+        "active_members": active_members,
+        "pending_members": pending_members,
+        "overdue_members": overdue_members,
+        "expiring_soon": expiring_soon,
+        "monthly_revenue": monthly_revenue
+    }
+    return stats
+
 # Razorpay Payment Routes
 @api_router.post("/razorpay/create-order", response_model=RazorpayOrderResponse)
 async def create_razorpay_order(order_data: RazorpayOrderCreate):
@@ -1761,31 +2042,35 @@ async def create_razorpay_order(order_data: RazorpayOrderCreate):
             order_id=razorpay_order["id"],
             amount=amount_in_paise,
             currency=order_data.currency,
-            key_id=os.environ['RAZORPAY_KEY_ID']
+            key_id=RAZORPAY_KEY_ID
         )
         
     except Exception as e:
         logger.error(f"Error creating Razorpay order: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def verify_razorpay_signature(order_id: str, payment_id: str, signature: str) -> bool:
+    """Check a Razorpay checkout signature: HMAC-SHA256 of 'order_id|payment_id' keyed with the key secret"""
+    expected = hmac.new(RAZORPAY_KEY_SECRET_BYTES, f"{order_id}|{payment_id}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected.encode(), signature.encode())
+
 @api_router.post("/razorpay/verify-payment")
 async def verify_razorpay_payment(payment_data: RazorpayPaymentVerify):
     try:
         # Verify payment signature
-        params_dict = {
-            'razorpay_order_id': payment_data.razorpay_order_id,
-            'razorpay_payment_id': payment_data.razorpay_payment_id,
-            'razorpay_signature': payment_data.razorpay_signature
-        }
-        
-        try:
-            razorpay_client.utility.verify_payment_signature(params_dict)
-        except Exception as e:
-            logger.error(f"Payment signature verification failed: {e}")
+        if not verify_razorpay_signature(
+            payment_data.razorpay_order_id,
+            payment_data.razorpay_payment_id,
+            payment_data.razorpay_signature
+        ):
+            logger.error(f"Payment signature verification failed for order {payment_data.razorpay_order_id}")
             raise HTTPException(status_code=400, detail="Payment signature verification failed")
         
-        # Get order details
-        order = await db.razorpay_orders.find_one({"order_id": payment_data.razorpay_order_id})
+        # Get order details and the member's current expiry together; the reads are independent
+        order, current_member = await asyncio.gather(
+            db.razorpay_orders.find_one({"order_id": payment_data.razorpay_order_id}, {"_id": 0, "amount": 1}),
+            db.members.find_one({"id": payment_data.member_id}, {"_id": 0, "membership_end": 1})
+        )
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
         
@@ -1798,13 +2083,6 @@ async def verify_razorpay_payment(payment_data: RazorpayPaymentVerify):
             razorpay_payment_id=payment_data.razorpay_payment_id
         )
         
-        # Save payment
-        payment_dict = prepare_for_mongo(payment_record.dict())
-        await db.payments.insert_one(payment_dict)
-        
-        # Get current member data
-        current_member = await db.members.find_one({"id": payment_data.member_id})
-        
         # Calculate membership extension based on specific payment amounts
         extension_days = 0
         if payment_record.amount == 1000:
@@ -1818,45 +2096,52 @@ async def verify_razorpay_payment(payment_data: RazorpayPaymentVerify):
             extension_days = await calculate_membership_extension(payment_record.amount)
         
         # Determine renewal date and new expiry date
+        now = datetime.now(timezone.utc)
         if current_member and current_member.get('membership_end'):
             try:
-                existing_end_date = datetime.fromisoformat(current_member['membership_end'])
+                existing_end_date = to_utc_datetime(current_member['membership_end'])
                 # Always use the previous expiry date as the renewal start date
                 membership_start_date = existing_end_date
                 current_end_date = existing_end_date
             except (ValueError, TypeError):
                 # Fallback if date parsing fails
-                membership_start_date = datetime.now(timezone.utc)
-                current_end_date = datetime.now(timezone.utc)
+                membership_start_date = now
+                current_end_date = now
         else:
             # New member case
-            membership_start_date = datetime.now(timezone.utc)
-            current_end_date = datetime.now(timezone.utc)
+            membership_start_date = now
+            current_end_date = now
         
         # Calculate new expiry date
         new_expiry_date = current_end_date + timedelta(days=extension_days)
         
-        # Update member status, expiry, and membership start date
-        await db.members.update_one(
-            {"id": payment_data.member_id},
-            {"$set": {
-                "current_payment_status": "paid",
-                "member_status": "active",
-                "membership_start": membership_start_date.isoformat(),
-                "membership_end": new_expiry_date.isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        # Update order status
-        await db.razorpay_orders.update_one(
-            {"order_id": payment_data.razorpay_order_id},
-            {"$set": {
-                "status": "paid",
-                "payment_id": payment_data.razorpay_payment_id,
-                "paid_at": datetime.now(timezone.utc)
-            }}
+        # Save the payment first; then count it toward the month's earnings, extend the
+        # membership and mark the order paid, which touch different documents, together
+        payment_dict = payment_record.model_dump()
+        await db.payments.insert_one(payment_dict)
+        await asyncio.gather(
+            update_monthly_earnings(payment_dict),
+            db.members.update_one(
+                {"id": payment_data.member_id},
+                {"$set": {
+                    "current_payment_status": "paid",
+                    "member_status": "active",
+                    "membership_start": membership_start_date,
+                    "membership_end": new_expiry_date,
+                    "status_bucket": membership_status_bucket(new_expiry_date),
+                    "updated_at": now
+                }}
+            ),
+            db.razorpay_orders.update_one(
+                {"order_id": payment_data.razorpay_order_id},
+                {"$set": {
+                    "status": "paid",
+                    "payment_id": payment_data.razorpay_payment_id,
+                    "paid_at": now
+                }}
+            )
         )
+        invalidate_dashboard_stats()
         
         return {"status": "success", "message": "Payment verified and recorded successfully"}
         
@@ -1866,10 +2151,12 @@ async def verify_razorpay_payment(payment_data: RazorpayPaymentVerify):
         logger.error(f"Error verifying payment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+RAZORPAY_KEY_RESPONSE = {"key_id": RAZORPAY_KEY_ID}
+
 @api_router.get("/razorpay/key")
 async def get_razorpay_key():
     """Get Razorpay public key for frontend"""
-    return {"key_id": os.environ['RAZORPAY_KEY_ID']}
+    return RAZORPAY_KEY_RESPONSE
 
 # PayU Payment Routes
 @api_router.post("/payu/create-order")
@@ -1924,11 +2211,12 @@ async def update_member_payment_status(member_id: str, amount: float):
     """Update member payment status and extend membership"""
     try:
         # Update monthly earnings
+        now = datetime.now(timezone.utc)
         payment_dict = {
             "member_id": member_id,
             "amount": amount,
             "payment_method": "payu",
-            "payment_date": datetime.now(timezone.utc)
+            "payment_date": now
         }
         await update_monthly_earnings(payment_dict)
         
@@ -1950,18 +2238,18 @@ async def update_member_payment_status(member_id: str, amount: float):
         # Determine renewal date and new expiry date
         if current_member and current_member.get('membership_end'):
             try:
-                existing_end_date = datetime.fromisoformat(current_member['membership_end'])
+                existing_end_date = to_utc_datetime(current_member['membership_end'])
                 # Always use the previous expiry date as the renewal start date
                 membership_start_date = existing_end_date
                 current_end_date = existing_end_date
             except (ValueError, TypeError):
                 # Fallback if date parsing fails
-                membership_start_date = datetime.now(timezone.utc)
-                current_end_date = datetime.now(timezone.utc)
+                membership_start_date = now
+                current_end_date = now
         else:
             # New member case
-            membership_start_date = datetime.now(timezone.utc)
-            current_end_date = datetime.now(timezone.utc)
+            membership_start_date = now
+            current_end_date = now
         
         # Calculate new expiry date
         new_expiry_date = current_end_date + timedelta(days=extension_days)
@@ -1972,19 +2260,21 @@ async def update_member_payment_status(member_id: str, amount: float):
             {"$set": {
                 "current_payment_status": "paid",
                 "member_status": "active",
-                "membership_start": membership_start_date.isoformat(),
-                "membership_end": new_expiry_date.isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "membership_start": membership_start_date,
+                "membership_end": new_expiry_date,
+                "status_bucket": membership_status_bucket(new_expiry_date),
+                "updated_at": now
             }}
         )
+        invalidate_dashboard_stats()
         
         # Send notification with extension details
         member_name = current_member.get('name', 'Unknown') if current_member else 'Unknown'
-        await send_system_notification(
+        run_in_background(send_system_notification(
             f"PayU Payment Success: ₹{amount}",
             f"PayU payment of ₹{amount} recorded for {member_name}. Membership extended by {extension_days} days until {new_expiry_date.strftime('%Y-%m-%d')}",
             "info"
-        )
+        ))
         
     except Exception as e:
         logger.error(f"Error updating member payment status: {e}")
@@ -2014,11 +2304,12 @@ async def payu_payment_success(request: Request):
         # Update payment order status
         order = await db.payment_orders.find_one({"txnid": txnid})
         if order:
+            now = datetime.now(timezone.utc)
             update_data = {
                 "status": "success" if status == "success" else "failed",
                 "payu_payment_id": response_params.get("payuMoneyId", ""),
                 "payment_response": response_params,
-                "updated_at": datetime.now(timezone.utc)
+                "updated_at": now
             }
             
             await db.payment_orders.update_one(
@@ -2035,27 +2326,26 @@ async def payu_payment_success(request: Request):
                     "amount": float(amount),
                     "payment_method": "payu",
                     "transaction_id": txnid,
-                    "payment_date": datetime.now(timezone.utc),
+                    "payment_date": now,
                     "description": f"PayU payment - {order.get('product_info', 'Gym membership')}",
                     "status": "completed"
                 }
                 
                 await db.payments.insert_one(payment_record)
+                invalidate_dashboard_stats()
                 
                 # Update member payment status if member_id exists
                 if order.get("member_id"):
                     await update_member_payment_status(order["member_id"], float(amount))
         
         # Redirect to frontend success page
-        frontend_url = os.environ.get('REACT_APP_FRONTEND_URL', 'http://localhost:3000')
-        success_url = f"{frontend_url}/payment/success?txnid={txnid}&status={status}&gateway=payu"
+        success_url = f"{FRONTEND_URL}/payment/success?txnid={txnid}&status={status}&gateway=payu"
         
         return {"redirect_url": success_url, "status": "success", "txnid": txnid}
         
     except Exception as e:
         logger.error(f"Error processing PayU success: {e}")
-        frontend_url = os.environ.get('REACT_APP_FRONTEND_URL', 'http://localhost:3000')
-        failure_url = f"{frontend_url}/payment/failure?error=processing_error&gateway=payu"
+        failure_url = f"{FRONTEND_URL}/payment/failure?error=processing_error&gateway=payu"
         return {"redirect_url": failure_url, "status": "error", "error": str(e)}
 
 @api_router.post("/payu/failure")
@@ -2083,15 +2373,13 @@ async def payu_payment_failure(request: Request):
             )
         
         # Redirect to frontend failure page
-        frontend_url = os.environ.get('REACT_APP_FRONTEND_URL', 'http://localhost:3000')
-        failure_url = f"{frontend_url}/payment/failure?txnid={txnid}&status={status}&error={error_message}&gateway=payu"
+        failure_url = f"{FRONTEND_URL}/payment/failure?txnid={txnid}&status={status}&error={error_message}&gateway=payu"
         
         return {"redirect_url": failure_url, "status": "failed", "txnid": txnid}
         
     except Exception as e:
         logger.error(f"Error processing PayU failure: {e}")
-        frontend_url = os.environ.get('REACT_APP_FRONTEND_URL', 'http://localhost:3000')
-        failure_url = f"{frontend_url}/payment/failure?error=processing_error&gateway=payu"
+        failure_url = f"{FRONTEND_URL}/payment/failure?error=processing_error&gateway=payu"
         return {"redirect_url": failure_url, "status": "error"}
 
 @api_router.post("/payu/verify-payment")
@@ -2176,10 +2464,9 @@ async def send_reminder_to_member(
             raise HTTPException(status_code=404, detail="Member not found")
         
         # Calculate days until expiry
-        expiry_date = datetime.fromisoformat(member['membership_end'])
-        if expiry_date.tzinfo is None:
-            expiry_date = expiry_date.replace(tzinfo=timezone.utc)
-        days_until_expiry = max(0, (expiry_date - datetime.now(timezone.utc)).days)
+        expiry_date = to_utc_datetime(member['membership_end'])
+        now = datetime.now(timezone.utc)
+        days_until_expiry = max(0, (expiry_date - now).days)
         
         # Check if custom message is provided
         custom_message = None
@@ -2203,7 +2490,7 @@ async def send_reminder_to_member(
                 "whatsapp_link": result.get("whatsapp_link", ""),
                 "sent_by": current_user.id,
                 "sent_by_name": current_user.full_name,
-                "sent_at": datetime.now(timezone.utc),
+                "sent_at": now,
                 "method": "custom_whatsapp" if custom_message else "whatsapp",
                 "status": "link_created",
                 "business_number": "+917099197780",
@@ -2214,11 +2501,11 @@ async def send_reminder_to_member(
             
             # Send notification about manual reminder
             message_type = "Custom WhatsApp reminder" if custom_message else "WhatsApp reminder"
-            await send_system_notification(
+            run_in_background(send_system_notification(
                 f"{message_type} sent",
                 f"{message_type} link created for {member['name']} by {current_user.full_name}",
                 "info"
-            )
+            ))
             return {
                 "message": result["message"],
                 "whatsapp_link": result["whatsapp_link"],
@@ -2233,6 +2520,18 @@ async def send_reminder_to_member(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+BULK_REMINDER_CONCURRENCY = 15
+# Member fields used to build reminder messages and the expiring members list
+REMINDER_MEMBER_PROJECTION = {"_id": 0, "id": 1, "name": 1, "phone": 1, "membership_type": 1, "membership_end": 1}
+REMINDER_HISTORY_PAGE_SIZE = 50
+
+# Message bodies and links make up most of a reminder log; listings leave them out and
+# the message endpoint returns them for a single log
+REMINDER_LOG_SUMMARY_PROJECTION = {"message_content": 0, "whatsapp_link": 0}
+REMINDER_LOG_BODY_PROJECTION = {"_id": 0, "id": 1, "member_phone": 1, "message_content": 1, "whatsapp_link": 1}
+# Fields a per-member reminder history lists; bodies are fetched per log like the register
+REMINDER_LOG_SUMMARY_FIELDS = {"id", "member_id", "member_name", "sent_at", "status", "method", "days_before_expiry", "sent_by_name", "is_custom"}
+
 @api_router.post("/reminders/send-bulk")
 async def send_bulk_reminders(
     days_before_expiry: int,
@@ -2252,33 +2551,34 @@ async def send_bulk_reminders(
         
         members = await db.members.find({
             "membership_end": {
-                "$gte": start_of_day.isoformat(),
-                "$lte": end_of_day.isoformat()
+                "$gte": start_of_day,
+                "$lte": end_of_day
             },
             "current_payment_status": {"$in": ["paid", "pending"]}
-        }).to_list(100)
+        }, REMINDER_MEMBER_PROJECTION).to_list(100)
         
         sent_count = 0
         failed_count = 0
         
-        for member in members:
-            try:
-                result = await whatsapp_service.send_reminder(member, days_before_expiry)
-                if result["success"]:
-                    sent_count += 1
-                else:
-                    failed_count += 1
-                    logger.warning(f"Failed to send reminder to {member.get('name', 'Unknown')}: {result.get('error', 'Unknown error')}")
-            except Exception as e:
-                logger.error(f"Error sending reminder to member {member.get('name', 'Unknown')} ({member.get('id', 'Unknown')}): {e}")
+        # Send reminders concurrently; the service writes all their logs in one round trip
+        results = await whatsapp_service.send_reminders_batch(members, days_before_expiry, BULK_REMINDER_CONCURRENCY)
+        
+        for member, result in zip(members, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error sending reminder to member {member.get('name', 'Unknown')} ({member.get('id', 'Unknown')}): {result}")
+                failed_count += 1
+            elif result["success"]:
+                sent_count += 1
+            else:
                 failed_count += 1
+                logger.warning(f"Failed to send reminder to {member.get('name', 'Unknown')}: {result.get('error', 'Unknown error')}")
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Bulk reminders sent",
             f"Sent {sent_count} WhatsApp reminders for members expiring in {days_before_expiry} days. {failed_count} failed. Initiated by {current_user.full_name}",
             "info"
-        )
+        ))
         
         return {
             "message": "Bulk reminders completed",
@@ -2303,21 +2603,14 @@ async def get_reminder_register(
             raise HTTPException(status_code=403, detail="Admin or Manager access required")
         
         # Get all reminder logs sorted by sent date
-        logs = await db.reminder_logs.find().sort("sent_at", -1).limit(1000).to_list(1000)
-        
-        # Clean logs data for serialization
-        cleaned_logs = []
-        for log in logs:
-            cleaned_log = parse_from_mongo(log.copy())
-            # Convert datetime to string if needed
-            if isinstance(cleaned_log.get('sent_at'), datetime):
-                cleaned_log['sent_at'] = cleaned_log['sent_at'].isoformat()
-            cleaned_logs.append(cleaned_log)
+        # Message bodies and links are the bulk of each log; the register lists metadata only
+        logs = await db.reminder_logs.find({}, {**REMINDER_LOG_SUMMARY_PROJECTION, "_id": 0}).sort("sent_at", -1).limit(1000).to_list(1000)
         
-        return {
-            "total_reminders": len(cleaned_logs),
-            "reminders": cleaned_logs
-        }
+        # orjson encodes sent_at natively, so the logs are returned as stored
+        return ORJSONResponse({
+            "total_reminders": len(logs),
+            "reminders": logs
+        })
         
     except HTTPException:
         raise
@@ -2325,25 +2618,46 @@ async def get_reminder_register(
         logger.error(f"Error getting reminder register: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/reminders/history")
+async def get_reminder_history(
+    limit: int = Query(REMINDER_HISTORY_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get recent reminder logs, newest first, one page at a time"""
+    try:
+        sort = [("sent_at", -1), ("_id", -1)]
+        history = await db.reminder_logs.find(
+            keyset_filter(sort, after),
+            REMINDER_LOG_SUMMARY_PROJECTION
+        ).sort(sort).limit(limit).to_list(limit)
+        headers = next_cursor_headers(history, sort, limit)
+        
+        # _id is only needed for the cursor; logs are otherwise returned as stored
+        for log in history:
+            del log["_id"]
+        return ORJSONResponse(history, headers=headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting reminder history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/reminders/history/{member_id}")
 async def get_member_reminder_history(
     member_id: str,
     current_user: User = Depends(get_current_active_user)
 ):
     try:
-        # Get reminder history for specific member
-        history = await db.reminder_logs.find({"member_id": member_id}).sort("sent_at", -1).to_list(100)
+        whatsapp_service = get_whatsapp_service()
+        if not whatsapp_service:
+            raise HTTPException(status_code=503, detail="WhatsApp service not available")
         
-        # Clean history data for serialization
-        cleaned_history = []
-        for log in history:
-            cleaned_log = parse_from_mongo(log.copy())
-            # Convert datetime to string if needed
-            if isinstance(cleaned_log.get('sent_at'), datetime):
-                cleaned_log['sent_at'] = cleaned_log['sent_at'].isoformat()
-            cleaned_history.append(cleaned_log)
+        # Get reminder history for specific member; message bodies are fetched per log
+        history = await whatsapp_service.get_reminder_history(member_id, fields=REMINDER_LOG_SUMMARY_FIELDS, limit=100)
         
-        return cleaned_history
+        return ORJSONResponse(history)
         
     except HTTPException:
         raise
@@ -2351,6 +2665,25 @@ async def get_member_reminder_history(
         logger.error(f"Error getting reminder history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/reminders/logs/{log_id}/message")
+async def get_reminder_message(
+    log_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get the message body and WhatsApp link of one reminder log"""
+    try:
+        message = await db.reminder_logs.find_one({"id": log_id}, REMINDER_LOG_BODY_PROJECTION)
+        if not message:
+            raise HTTPException(status_code=404, detail="Reminder log not found")
+        
+        return message
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting reminder message: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/reminders/expiring-members")
 async def get_expiring_members_for_reminders(
     days: int = 7,
@@ -2363,33 +2696,37 @@ async def get_expiring_members_for_reminders(
         if days == 0:
             # Get already expired members
             members = await db.members.find({
-                "membership_end": {"$lt": current_time.isoformat()}
-            }).to_list(100)
+                "membership_end": {"$lt": current_time}
+            }, REMINDER_MEMBER_PROJECTION).to_list(100)
         elif days < 0:
             # Get all members (for debugging)
-            members = await db.members.find({}).to_list(100)
+            members = await db.members.find({}, REMINDER_MEMBER_PROJECTION).to_list(100)
         else:
             # Get members expiring within specified days
             future_date = current_time + timedelta(days=days)
             members = await db.members.find({
-                "$and": [
-                    {"membership_end": {"$gt": current_time.isoformat()}},
-                    {"membership_end": {"$lte": future_date.isoformat()}}
-                ]
-            }).to_list(100)
+                "membership_end": {"$gt": current_time, "$lte": future_date}
+            }, REMINDER_MEMBER_PROJECTION).to_list(100)
+        
+        # Look up which of these members already had a reminder today in one query
+        today_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        sent_today = set(await db.reminder_logs.distinct("member_id", {
+            "member_id": {"$in": [member.get("id") for member in members]},
+            "$or": [
+                {"sent_date": today_start.date().isoformat()},
+                {"sent_at": {"$gte": today_start}}
+            ]
+        }))
         
         # Clean and process members data
         cleaned_members = []
         for member in members:
-            cleaned_member = parse_from_mongo(member.copy())
+            cleaned_member = parse_from_mongo(member)
             
             # Calculate days left
             if cleaned_member.get('membership_end'):
                 try:
-                    if isinstance(cleaned_member['membership_end'], str):
-                        end_date = datetime.fromisoformat(cleaned_member['membership_end'])
-                    else:
-                        end_date = cleaned_member['membership_end']
+                    end_date = to_utc_datetime(cleaned_member['membership_end'])
                     
                     days_left = (end_date - current_time).days
                     cleaned_member['days_until_expiry'] = days_left
@@ -2397,12 +2734,7 @@ async def get_expiring_members_for_reminders(
                     cleaned_member['days_until_expiry'] = 0
             
             # Check if reminder was already sent today
-            today = datetime.now(timezone.utc).date()
-            reminder_sent = await db.reminder_logs.find_one({
-                "member_id": cleaned_member["id"],
-                "sent_date": today.isoformat()
-            })
-            cleaned_member["reminder_sent_today"] = reminder_sent is not None
+            cleaned_member["reminder_sent_today"] = cleaned_member.get("id") in sent_today
             
             # Ensure required fields
             cleaned_member.setdefault('name', 'Unknown Member')
@@ -2456,7 +2788,7 @@ async def test_reminder_service():
 @api_router.get("/settings", response_model=GymSettings)
 async def get_gym_settings():
     try:
-        settings = await db.gym_settings.find_one()
+        settings = await get_named_setting("general")
         if not settings:
             # Create default settings
             default_settings = GymSettings(
@@ -2472,12 +2804,18 @@ async def get_gym_settings():
                 terms_conditions="Welcome to Iron Paradise Gym. Please follow all gym rules and regulations."
             )
             # Add admission fee to settings
-            settings_dict = prepare_for_mongo(default_settings.dict())
+            settings_dict = default_settings.model_dump()
             settings_dict['admission_fee'] = 1500.0  # Default admission fee, admin can change
-            await db.gym_settings.insert_one(settings_dict)
-            settings_dict = prepare_for_mongo(default_settings.dict())
-            await db.gym_settings.insert_one(settings_dict)
-            return default_settings
+            
+            # Upsert so concurrent first requests share one document
+            settings = await db.gym_settings.find_one_and_update(
+                {"setting_name": "general"},
+                {"$setOnInsert": settings_dict},
+                upsert=True,
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            invalidate_named_setting("general")
         
         return GymSettings(**parse_from_mongo(settings))
     except Exception as e:
@@ -2489,25 +2827,21 @@ async def update_gym_settings(
     current_user: User = Depends(get_current_active_user)
 ):
     try:
-        # Get current settings
-        current_settings = await db.gym_settings.find_one()
-        if not current_settings:
-            raise HTTPException(status_code=404, detail="Settings not found")
-        
         # Update settings
-        update_data = {k: v for k, v in settings_update.dict().items() if v is not None}
+        update_data = {k: v for k, v in settings_update.model_dump().items() if v is not None}
         update_data['updated_by'] = current_user.username
         update_data['updated_at'] = datetime.now(timezone.utc)
         
-        update_data = prepare_for_mongo(update_data)
-        
-        await db.gym_settings.update_one(
-            {"id": current_settings["id"]},
-            {"$set": update_data}
+        updated_settings = await db.gym_settings.find_one_and_update(
+            {"setting_name": "general"},
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
         )
+        if not updated_settings:
+            raise HTTPException(status_code=404, detail="Settings not found")
+        invalidate_named_setting("general")
         
-        # Get updated settings
-        updated_settings = await db.gym_settings.find_one({"id": current_settings["id"]})
         return GymSettings(**parse_from_mongo(updated_settings))
         
     except HTTPException:
@@ -2539,6 +2873,7 @@ async def update_admission_fee(
             },
             upsert=True
         )
+        invalidate_named_setting("admission_fee")
         
         # Also update main settings document
         await db.settings.update_one(
@@ -2548,11 +2883,11 @@ async def update_admission_fee(
         )
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Admission Fee Updated",
             f"Monthly membership admission fee updated to ₹{admission_fee} by {current_admin.full_name}",
             "info"
-        )
+        ))
         
         return {
             "message": "Admission fee updated successfully",
@@ -2581,7 +2916,7 @@ async def get_admission_fee_setting(current_user: User = Depends(get_current_act
 async def get_bank_account_settings(current_user: User = Depends(get_current_active_user)):
     """Get bank account details for payments"""
     try:
-        settings = await db.gym_settings.find_one({"setting_name": "bank_account"})
+        settings = await get_named_setting("bank_account")
         if settings and "account_details" in settings:
             return settings["account_details"]
         
@@ -2600,7 +2935,7 @@ async def get_bank_account_settings(current_user: User = Depends(get_current_act
 async def get_reminder_template(current_user: User = Depends(get_current_active_user)):
     """Get current reminder message template"""
     try:
-        template = await db.gym_settings.find_one({"setting_name": "reminder_template"})
+        template = await get_named_setting("reminder_template")
         if template and "message_template" in template:
             return template["message_template"]
         
@@ -2665,12 +3000,13 @@ async def update_reminder_template(
             },
             upsert=True
         )
+        invalidate_named_setting("reminder_template")
         
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Reminder template updated",
             f"WhatsApp reminder message template updated by {current_user.full_name}",
             "info"
-        )
+        ))
         
         return {"message": "Reminder template updated successfully"}
         
@@ -2706,12 +3042,13 @@ async def update_bank_account_settings(
             },
             upsert=True
         )
+        invalidate_named_setting("bank_account")
         
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Bank account details updated",
             f"Payment account information updated by {current_admin.full_name}",
             "info"
-        )
+        ))
         
         return {"message": "Bank account details updated successfully"}
         
@@ -2751,6 +3088,7 @@ async def update_membership_rates(
             },
             upsert=True
         )
+        invalidate_named_setting("membership_rates")
         
         # Also update main settings document
         await db.settings.update_one(
@@ -2764,11 +3102,11 @@ async def update_membership_rates(
         )
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Membership Rates Updated",
             f"Membership pricing updated by {current_admin.full_name}",
             "info"
-        )
+        ))
         
         return {
             "message": "Membership rates updated successfully",
@@ -2780,6 +3118,13 @@ async def update_membership_rates(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 # Real-time Notification System
+# Notifications are buffered and written in batches by flush_notifications
+NOTIFICATION_QUEUE_SIZE = 1000
+NOTIFICATION_BATCH_SIZE = 100
+NOTIFICATION_FLUSH_INTERVAL = 0.2  # seconds
+notification_queue = None
+notification_flush_task = None
+
 async def send_system_notification(title: str, message: str, type: str, user_id: str = None):
     """Send system notification"""
     try:
@@ -2790,8 +3135,19 @@ async def send_system_notification(title: str, message: str, type: str, user_id:
             user_id=user_id
         )
         
-        notification_dict = prepare_for_mongo(notification.dict())
-        await db.notifications.insert_one(notification_dict)
+        notification_dict = notification.model_dump()
+        
+        # Queue for the batch writer; write directly if it isn't running or is backed up
+        queued = False
+        if notification_queue is not None:
+            try:
+                notification_queue.put_nowait(notification_dict)
+                queued = True
+            except asyncio.QueueFull:
+                pass
+        if not queued:
+            await db.notifications.insert_one(notification_dict)
+            invalidate_unread_counts(None if user_id is None else [user_id])
         
         # TODO: Send via WebSocket to connected clients
         logger.info(f"Notification sent: {title}")
@@ -2799,6 +3155,36 @@ async def send_system_notification(title: str, message: str, type: str, user_id:
     except Exception as e:
         logger.error(f"Error sending notification: {e}")
 
+async def write_notifications(batch: list):
+    """Insert a batch of queued notifications"""
+    try:
+        await db.notifications.insert_many(batch, ordered=False)
+    except Exception as e:
+        logger.error(f"Error writing {len(batch)} notifications: {e}")
+    
+    user_ids = {notification["user_id"] for notification in batch}
+    invalidate_unread_counts(None if None in user_ids else user_ids)
+
+async def flush_notifications():
+    """Drain the notification queue, writing up to NOTIFICATION_BATCH_SIZE per NOTIFICATION_FLUSH_INTERVAL"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await notification_queue.get()]
+        deadline = loop.time() + NOTIFICATION_FLUSH_INTERVAL
+        while len(batch) < NOTIFICATION_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(notification_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        await write_notifications(batch)
+        for _ in batch:
+            notification_queue.task_done()
+
+NOTIFICATION_PROJECTION = {"_id": 0, **{field: 1 for field in SystemNotification.model_fields}}
+
 @api_router.get("/notifications", response_model=List[SystemNotification])
 async def get_notifications(
     current_user: User = Depends(get_current_active_user),
@@ -2813,12 +3199,41 @@ async def get_notifications(
             ]
         }
         
-        notifications = await db.notifications.find(query).sort("created_at", -1).limit(limit).to_list(limit)
-        return [SystemNotification(**parse_from_mongo(notif)) for notif in notifications]
+        # Notifications are only written through SystemNotification, so project its fields and skip re-validation
+        notifications = await db.notifications.find(query, NOTIFICATION_PROJECTION).sort("created_at", -1).limit(limit).to_list(limit)
+        return trusted_list_response(notifications)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Unread counts per user, cached briefly and dropped when notifications are written or read
+UNREAD_COUNT_CACHE_TTL = 30  # seconds
+UNREAD_COUNT_CACHE_SIZE = 10000  # users
+unread_count_cache = TTLCache(UNREAD_COUNT_CACHE_TTL, maxsize=UNREAD_COUNT_CACHE_SIZE)
+
+def invalidate_unread_counts(user_ids=None):
+    """Drop cached unread counts for the given users, or for everyone when None"""
+    if user_ids is None:
+        unread_count_cache.invalidate()
+        return
+    for user_id in user_ids:
+        unread_count_cache.invalidate(user_id)
+
+@api_router.get("/notifications/unread-count")
+async def get_unread_notification_count(current_user: User = Depends(get_current_active_user)):
+    """Get the number of unread notifications for the current user, including broadcasts"""
+    try:
+        unread_count = await unread_count_cache.get(
+            current_user.id,
+            lambda: db.notifications.count_documents({
+                "user_id": {"$in": [current_user.id, None]},
+                "read": False
+            })
+        )
+        return {"unread_count": unread_count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.patch("/notifications/{notification_id}/read")
 async def mark_notification_read(
     notification_id: str,
@@ -2832,19 +3247,25 @@ async def mark_notification_read(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Notification not found")
+        # The notification may be a broadcast counted for every user
+        invalidate_unread_counts()
         
         return {"message": "Notification marked as read"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.patch("/notifications/mark-all-read")
 async def mark_all_notifications_read(current_user: User = Depends(get_current_active_user)):
-    """Mark all notifications as read for current user"""
+    """Mark all notifications as read for current user, including the broadcasts they see"""
     try:
-        result = await db.notifications.update_many(
-            {"user_id": current_user.id, "read": False},
+        result = await db.notifications.with_options(write_concern=MAJORITY_WRITE_CONCERN).update_many(
+            {"user_id": {"$in": [current_user.id, None]}, "read": False},
             {"$set": {"read": True, "read_at": datetime.now(timezone.utc)}}
         )
+        # Broadcasts share one read flag, so every user's count may have changed
+        invalidate_unread_counts()
         
         return {
             "message": "All notifications marked as read",
@@ -2858,6 +3279,7 @@ async def clear_all_notifications(current_user: User = Depends(get_current_activ
     """Clear all notifications for current user"""
     try:
         result = await db.notifications.delete_many({"user_id": current_user.id})
+        invalidate_unread_counts([current_user.id])
         
         return {
             "message": "All notifications cleared",
@@ -2880,44 +3302,62 @@ async def delete_notification(
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Notification not found")
+        invalidate_unread_counts([current_user.id])
         
         return {"message": "Notification deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(AuthMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_origins=CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
-    global reminder_service_instance
+    global reminder_service_instance, membership_sweep_task, notification_queue, notification_flush_task
     try:
         logger.info("🚀 Starting Iron Paradise Gym initialization...")
         
-        # Initialize default permissions
-        await initialize_default_permissions()
-        logger.info("✅ Default permissions initialized")
-        
-        # Initialize default payment gateways
-        await initialize_default_payment_gateways()
-        logger.info("✅ Default payment gateways initialized")
-        
-        # Initialize receipt templates
-        await initialize_receipt_templates()
-        logger.info("✅ Receipt templates initialized")
+        # Start the notification batch writer
+        notification_queue = asyncio.Queue(maxsize=NOTIFICATION_QUEUE_SIZE)
+        notification_flush_task = asyncio.create_task(flush_notifications())
+        
+        # Seed defaults, convert legacy ISO-string dates to native dates and replace legacy
+        # reminder log ids; these set different fields, so run them together
+        await asyncio.gather(
+            initialize_default_permissions(),
+            initialize_default_payment_gateways(),
+            initialize_receipt_templates(),
+            migrate_datetime_fields(),
+            migrate_general_settings(),
+            migrate_reminder_log_ids()
+        )
+        logger.info("✅ Default permissions, payment gateways and receipt templates initialized")
+        logger.info("✅ Datetime fields migrated")
         
-        # Create default admin user ONLY if no admin exists
+        # Initialize database indexes while looking up the existing admin users
         logger.info("🔍 Checking for existing admin users...")
-        admin_count = await db.users.count_documents({"role": "admin"})
+        _, admin_count, test_admin_exists = await asyncio.gather(
+            initialize_indexes(),
+            db.users.count_documents({"role": "admin"}),
+            db.users.find_one({"username": "test_admin"}, {"_id": 1})
+        )
+        logger.info("✅ Database indexes initialized")
         logger.info(f"📊 Found {admin_count} admin users")
         
         # Log existing admin users for debugging
@@ -2927,7 +3367,6 @@ async def startup_event():
                 logger.info(f"🔑 Admin user found: {admin.get('username')} ({admin.get('email')})")
         
         # Create test admin user for testing purposes
-        test_admin_exists = await db.users.find_one({"username": "test_admin"})
         if not test_admin_exists:
             logger.info("🧪 Creating test admin user for testing purposes...")
             test_admin = User(
@@ -2937,7 +3376,7 @@ async def startup_event():
                 role=UserRole.ADMIN
             )
             
-            user_dict = prepare_for_mongo(test_admin.dict())
+            user_dict = test_admin.model_dump()
             user_dict['hashed_password'] = get_password_hash("TestPass123!")
             
             await db.users.insert_one(user_dict)
@@ -2956,7 +3395,7 @@ async def startup_event():
                 role=UserRole.ADMIN
             )
             
-            user_dict = prepare_for_mongo(admin_user.dict())
+            user_dict = admin_user.model_dump()
             # Use a secure temporary password - admin should change this immediately
             user_dict['hashed_password'] = get_password_hash("IronParadise@2024")
             
@@ -2980,6 +3419,10 @@ async def startup_event():
         reminder_service_instance.start()
         logger.info("Reminder service started successfully")
         
+        # Start membership expiry sweep
+        membership_sweep_task = asyncio.create_task(periodic_membership_sweep())
+        logger.info("Membership sweep started")
+        
         # Initialize WhatsApp service
         whatsapp_service = await initialize_whatsapp_service(db)
         if whatsapp_service:
@@ -3000,6 +3443,7 @@ async def startup_event():
 async def initialize_default_payment_gateways():
     """Initialize default payment gateways"""
     try:
+        now = datetime.now(timezone.utc)
         default_gateways = [
             {
                 "id": str(uuid.uuid4()),
@@ -3009,7 +3453,7 @@ async def initialize_default_payment_gateways():
                 "supported_methods": ["card", "netbanking", "wallet", "upi"],
                 "fees_percentage": 2.5,
                 "currency": "INR",
-                "created_at": datetime.now(timezone.utc)
+                "created_at": now
             },
             {
                 "id": str(uuid.uuid4()),
@@ -3019,7 +3463,7 @@ async def initialize_default_payment_gateways():
                 "supported_methods": ["card", "netbanking", "wallet", "upi"],
                 "fees_percentage": 2.3,
                 "currency": "INR",
-                "created_at": datetime.now(timezone.utc)
+                "created_at": now
             },
             {
                 "id": str(uuid.uuid4()),
@@ -3029,7 +3473,7 @@ async def initialize_default_payment_gateways():
                 "supported_methods": ["upi", "wallet"],
                 "fees_percentage": 1.5,
                 "currency": "INR",
-                "created_at": datetime.now(timezone.utc)
+                "created_at": now
             },
             {
                 "id": str(uuid.uuid4()),
@@ -3039,7 +3483,7 @@ async def initialize_default_payment_gateways():
                 "supported_methods": ["card", "netbanking", "wallet", "upi"],
                 "fees_percentage": 2.0,
                 "currency": "INR",
-                "created_at": datetime.now(timezone.utc)
+                "created_at": now
             },
             {
                 "id": str(uuid.uuid4()),
@@ -3049,15 +3493,21 @@ async def initialize_default_payment_gateways():
                 "supported_methods": ["card", "netbanking", "wallet", "upi"],
                 "fees_percentage": 1.5,
                 "currency": "INR",
-                "created_at": datetime.now(timezone.utc)
+                "created_at": now
             }
         ]
         
-        for gateway in default_gateways:
-            existing = await db.payment_gateways.find_one({"provider": gateway["provider"]})
-            if not existing:
-                await db.payment_gateways.insert_one(gateway)
-                logger.info(f"Created payment gateway: {gateway['name']}")
+        # Create any missing gateways in one round trip; $setOnInsert leaves existing ones untouched
+        result = await db.payment_gateways.bulk_write([
+            UpdateOne(
+                {"provider": gateway["provider"]},
+                {"$setOnInsert": {k: v for k, v in gateway.items() if k != "provider"}},
+                upsert=True
+            )
+            for gateway in default_gateways
+        ], ordered=False)
+        for index in result.upserted_ids:
+            logger.info(f"Created payment gateway: {default_gateways[index]['name']}")
                 
     except Exception as e:
         logger.error(f"Error initializing payment gateways: {e}")
@@ -3066,6 +3516,7 @@ async def initialize_default_payment_gateways():
 async def initialize_receipt_templates():
     """Initialize default receipt templates"""
     try:
+        now = datetime.now(timezone.utc)
         default_template = {
             "id": str(uuid.uuid4()),
             "name": "Default Receipt Template",
@@ -3097,44 +3548,218 @@ async def initialize_receipt_templates():
                 "terms_text": "All payments are non-refundable. Terms and conditions apply.",
                 "contact_info": "For queries, contact us at info@ironparadise.com"
             },
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc)
+            "created_at": now,
+            "updated_at": now
         }
         
-        existing = await db.receipt_templates.find_one({"is_default": True})
-        if not existing:
-            await db.receipt_templates.insert_one(default_template)
+        # Create the default template only if none exists, in one round trip
+        result = await db.receipt_templates.update_one(
+            {"is_default": True},
+            {"$setOnInsert": {k: v for k, v in default_template.items() if k != "is_default"}},
+            upsert=True
+        )
+        if result.upserted_id:
             logger.info("Created default receipt template")
             
     except Exception as e:
         logger.error(f"Error initializing receipt templates: {e}")
         raise
 
+# Soft-deleted receipts are purged by a TTL index once this retention window has passed
+DELETED_RECEIPT_RETENTION_DAYS = int(os.environ.get('DELETED_RECEIPT_RETENTION_DAYS', '90'))
+
+async def initialize_indexes():
+    """Create the indexes backing frequent query predicates"""
+    indexes = [
+        (db.users, [("id", 1)], {"unique": True}),
+        (db.users, [("username", 1)], {"unique": True}),
+        (db.users, [("email", 1)], {"unique": True}),
+        (db.users, [("role", 1)], {}),
+        (db.users, [("custom_role_id", 1)], {}),
+        (db.members, [("id", 1)], {"unique": True}),
+        (db.members, [("membership_end", 1)], {}),
+        (db.members, [("current_payment_status", 1), ("membership_end", 1)], {}),
+        (db.members, [("status_bucket", 1), ("current_payment_status", 1)], {}),
+        (db.payments, [("id", 1)], {"unique": True}),
+        (db.payments, [("transaction_id", 1)], {}),
+        (db.payments, [("member_id", 1)], {}),
+        (db.custom_roles, [("id", 1)], {"unique": True}),
+        (db.permissions, [("id", 1)], {"unique": True}),
+        (db.monthly_earnings, [("year", 1), ("month", 1)], {"unique": True}),
+        (db.payments, [("payment_date", -1), ("id", -1)], {}),
+        (db.reminder_logs, [("id", 1)], {"unique": True, "partialFilterExpression": {"id": {"$exists": True}}, "name": "reminder_log_by_id"}),
+        (db.reminder_logs, [("member_id", 1), ("sent_at", -1)], {}),
+        (db.reminder_logs, [("sent_at", -1), ("_id", -1)], {}),
+        (db.razorpay_orders, [("order_id", 1)], {"unique": True}),
+        (db.receipts, [("id", 1)], {"unique": True}),
+        (db.receipts, [("payment_id", 1)], {"unique": True, "partialFilterExpression": {"status": "active"}, "name": "active_receipt_by_payment"}),
+        (db.receipts, [("status", 1), ("generated_at", -1), ("id", -1)], {}),
+        (db.receipts, [("deleted_at", 1)], {"expireAfterSeconds": DELETED_RECEIPT_RETENTION_DAYS * 24 * 3600, "partialFilterExpression": {"status": "deleted"}}),
+        (db.gym_settings, [("setting_name", 1)], {"unique": True, "partialFilterExpression": {"setting_name": {"$exists": True}}}),
+        (db.notifications, [("id", 1)], {"unique": True}),
+        (db.notifications, [("user_id", 1), ("created_at", -1)], {}),
+        (db.notifications, [("user_id", 1)], {"partialFilterExpression": {"read": False}, "name": "unread_by_user"}),
+    ]
+    
+    async def create_index(collection, keys, options):
+        try:
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            logger.error(f"Error creating index {keys} on {collection.name}: {e}")
+    
+    await asyncio.gather(*(create_index(collection, keys, options) for collection, keys, options in indexes))
+
+async def migrate_general_settings():
+    """Tag the untagged gym settings document written by older versions as the 'general' setting"""
+    try:
+        if not await db.gym_settings.find_one({"setting_name": "general"}, {"_id": 1}):
+            await db.gym_settings.update_one(
+                {"setting_name": {"$exists": False}},
+                {"$set": {"setting_name": "general"}}
+            )
+    except Exception as e:
+        logger.error(f"Error migrating general gym settings: {e}")
+
+async def migrate_reminder_log_ids():
+    """Give reminder logs written by older versions a uuid id so the unique id index can be built"""
+    try:
+        # Older WhatsApp logs built ids from the send second, which can collide; scheduled logs had none
+        updates = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"id": str(uuid.uuid4())}})
+            async for doc in db.reminder_logs.find(
+                {"$or": [{"id": {"$exists": False}}, {"id": {"$regex": "^reminder_"}}]},
+                {"_id": 1}
+            )
+        ]
+        if updates:
+            await db.reminder_logs.bulk_write(updates, ordered=False)
+            logger.info(f"Assigned uuid ids to {len(updates)} reminder logs")
+    except Exception as e:
+        logger.error(f"Error migrating reminder log ids: {e}")
+
+async def migrate_datetime_fields():
+    """Convert datetimes stored as ISO strings by older versions to native BSON dates"""
+    datetime_fields = {
+        "members": ["join_date", "membership_start", "membership_end", "created_at", "updated_at"],
+        "payments": ["payment_date", "created_at"],
+        "users": ["last_login", "created_at", "updated_at"],
+        "custom_roles": ["created_at", "updated_at"],
+        "gym_settings": ["updated_at"],
+        "notifications": ["created_at"],
+        "reminder_logs": ["membership_end"]
+    }
+    
+    for collection_name, fields in datetime_fields.items():
+        try:
+            collection = db[collection_name]
+            updates = []
+            async for doc in collection.find(
+                {"$or": [{field: {"$type": "string"}} for field in fields]},
+                {field: 1 for field in fields}
+            ):
+                converted = {}
+                for field in fields:
+                    if isinstance(doc.get(field), str):
+                        try:
+                            converted[field] = to_utc_datetime(doc[field])
+                        except ValueError:
+                            logger.warning(f"Unparseable {field} in {collection_name} {doc['_id']}: {doc[field]}")
+                if converted:
+                    updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": converted}))
+            
+            if updates:
+                await collection.bulk_write(updates, ordered=False)
+                logger.info(f"Converted datetime fields in {len(updates)} {collection_name} documents")
+        except Exception as e:
+            logger.error(f"Error migrating datetime fields in {collection_name}: {e}")
+
+MEMBERSHIP_SWEEP_INTERVAL = 60  # seconds
+membership_sweep_task = None
+
+async def reconcile_membership_status():
+    """Mark lapsed memberships expired and reactivate renewed ones"""
+    current_time = datetime.now(timezone.utc)
+    
+    expired = await db.members.update_many(
+        {
+            "membership_end": {"$lt": current_time},
+            "$or": [
+                {"current_payment_status": {"$ne": "expired"}},
+                {"member_status": {"$ne": "inactive"}}
+            ]
+        },
+        {"$set": {"current_payment_status": "expired", "member_status": "inactive"}}
+    )
+    reactivated = await db.members.update_many(
+        {"membership_end": {"$gt": current_time}, "current_payment_status": "expired"},
+        {"$set": {"current_payment_status": "paid", "member_status": "active"}}
+    )
+    
+    if expired.modified_count or reactivated.modified_count:
+        invalidate_dashboard_stats()
+        logger.info(f"Membership sweep: {expired.modified_count} expired, {reactivated.modified_count} reactivated")
+    
+    await refresh_status_buckets(current_time)
+
+async def refresh_status_buckets(current_time: datetime):
+    """Move members whose membership_end crossed a bucket boundary into their new status_bucket"""
+    seven_days_from_now = current_time + timedelta(days=7)
+    thirty_days_from_now = current_time + timedelta(days=30)
+    bucket_ranges = [
+        ("expired", {"$lt": current_time}),
+        ("expiring_7days", {"$gte": current_time, "$lte": seven_days_from_now}),
+        ("expiring_30days", {"$gt": seven_days_from_now, "$lte": thirty_days_from_now}),
+        ("active", {"$gt": thirty_days_from_now}),
+    ]
+    for bucket, end_range in bucket_ranges:
+        await db.members.update_many(
+            {"membership_end": end_range, "status_bucket": {"$ne": bucket}},
+            {"$set": {"status_bucket": bucket}}
+        )
+
+async def periodic_membership_sweep():
+    """Run the membership status sweep every MEMBERSHIP_SWEEP_INTERVAL seconds"""
+    while True:
+        try:
+            await reconcile_membership_status()
+        except Exception as e:
+            logger.error(f"Error in membership sweep: {e}")
+        await asyncio.sleep(MEMBERSHIP_SWEEP_INTERVAL)
+
+# Fallbacks for register fields missing from older receipts
+RECEIPT_REGISTER_DEFAULTS = {"member_name": "Unknown", "payment_amount": 0, "payment_method": "cash"}
+
+def clean_register_receipt(receipt: dict) -> dict:
+    """Clean a receipt register entry for serialization"""
+    # The register query already projects out _id, so only missing fields need filling
+    cleaned_receipt = {**RECEIPT_REGISTER_DEFAULTS, **receipt}
+    if 'id' not in receipt:
+        cleaned_receipt['id'] = str(uuid.uuid4())
+    if 'generated_at' not in receipt:
+        cleaned_receipt['generated_at'] = datetime.now(timezone.utc)
+    return cleaned_receipt
+
 # Receipt Register Management API
 @app.get("/api/receipts/register")
-async def get_receipt_register(current_user: User = Depends(get_current_active_user)):
-    """Get all stored receipts in register"""
+async def get_receipt_register(
+    current_user: User = Depends(get_current_active_user),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Get a page of stored receipts in register, newest first"""
     try:
-        receipts = await db.receipts.find({"status": "active"}).sort("generated_at", -1).to_list(1000)
-        
-        # Clean receipts data for serialization
-        cleaned_receipts = []
-        for receipt in receipts:
-            cleaned_receipt = parse_from_mongo(receipt.copy())
-            # Ensure required fields exist
-            cleaned_receipt.setdefault('id', str(uuid.uuid4()))
-            cleaned_receipt.setdefault('member_name', 'Unknown')
-            cleaned_receipt.setdefault('payment_amount', 0)
-            cleaned_receipt.setdefault('payment_method', 'cash')
-            cleaned_receipt.setdefault('generated_at', datetime.now(timezone.utc).isoformat())
-            
-            # Convert datetime to string if needed
-            if isinstance(cleaned_receipt.get('generated_at'), datetime):
-                cleaned_receipt['generated_at'] = cleaned_receipt['generated_at'].isoformat()
-            
-            cleaned_receipts.append(cleaned_receipt)
-        
-        return cleaned_receipts
+        sort = [("generated_at", -1), ("id", -1)]
+        # The register only lists receipts; the rendered HTML is the bulk of each document
+        cursor = db.receipts.find(
+            {"status": "active", **keyset_filter(sort, after)}, {"_id": 0, "receipt_html": 0}
+        ).sort(sort).limit(limit).batch_size(CURSOR_BATCH_SIZE)
+        
+        # Read the cursor before cleaning, which fills defaults for serialization
+        receipts = await cursor.to_list(None)
+        headers = next_cursor_headers(receipts, sort, limit)
+        return ORJSONResponse([clean_register_receipt(receipt) for receipt in receipts], headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching receipts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -3172,11 +3797,11 @@ async def delete_receipt(receipt_id: str, current_admin: User = Depends(require_
         )
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Receipt Deleted",
             f"Receipt for {receipt.get('member_name', 'Unknown')} - ₹{receipt.get('payment_amount', 0)} deleted by {current_admin.full_name}",
             "warning"
-        )
+        ))
         
         return {"message": "Receipt deleted successfully"}
         
@@ -3195,13 +3820,14 @@ async def clear_all_members(current_admin: User = Depends(require_admin_role)):
         
         # Delete all members
         result = await db.members.delete_many({})
+        invalidate_dashboard_stats()
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "⚠️ ALL MEMBERS CLEARED",
             f"CRITICAL: All {member_count} members deleted by {current_admin.full_name}",
             "error"
-        )
+        ))
         
         return {
             "message": f"Successfully cleared {result.deleted_count} members",
@@ -3221,16 +3847,17 @@ async def clear_all_payments(current_admin: User = Depends(require_admin_role)):
         
         # Delete all payments
         result = await db.payments.delete_many({})
+        invalidate_dashboard_stats()
         
         # Also clear monthly earnings
         await db.monthly_earnings.delete_many({})
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "⚠️ ALL PAYMENTS CLEARED",
             f"CRITICAL: All {payment_count} payments and earnings cleared by {current_admin.full_name}",
             "error"
-        )
+        ))
         
         return {
             "message": f"Successfully cleared {result.deleted_count} payments and earnings",
@@ -3252,11 +3879,11 @@ async def clear_all_receipts(current_admin: User = Depends(require_admin_role)):
         result = await db.receipts.delete_many({})
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "⚠️ ALL RECEIPTS CLEARED",
             f"CRITICAL: All {receipt_count} receipts cleared by {current_admin.full_name}",
             "error"
-        )
+        ))
         
         return {
             "message": f"Successfully cleared {result.deleted_count} receipts",
@@ -3286,6 +3913,7 @@ async def clear_all_application_data(
         # Delete all data
         members_deleted = await db.members.delete_many({})
         payments_deleted = await db.payments.delete_many({})
+        invalidate_dashboard_stats()
         receipts_deleted = await db.receipts.delete_many({})
         earnings_deleted = await db.monthly_earnings.delete_many({})
         reminders_deleted = await db.reminder_logs.delete_many({})
@@ -3314,6 +3942,7 @@ async def clear_all_members_simple(current_admin: User = Depends(require_admin_r
     """Clear all members data (admin only - DANGEROUS)"""
     try:
         result = await db.members.delete_many({})
+        invalidate_dashboard_stats()
         return {"message": f"Successfully cleared {result.deleted_count} members", "deleted_count": result.deleted_count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -3323,6 +3952,7 @@ async def clear_all_payments_simple(current_admin: User = Depends(require_admin_
     """Clear all payments data (admin only - DANGEROUS)"""
     try:
         payments_result = await db.payments.delete_many({})
+        invalidate_dashboard_stats()
         earnings_result = await db.monthly_earnings.delete_many({})
         return {"message": f"Successfully cleared {payments_result.deleted_count} payments", "deleted_count": payments_result.deleted_count}
     except Exception as e:
@@ -3337,6 +3967,9 @@ async def clear_all_receipts_simple(current_admin: User = Depends(require_admin_
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+MAX_BULK_RECEIPT_DELETE = 1000
+RECEIPT_DELETE_CHUNK_SIZE = 50
+
 @api_router.post("/receipts/bulk-delete")
 async def bulk_delete_receipts(
     receipt_data: dict,
@@ -3348,27 +3981,28 @@ async def bulk_delete_receipts(
         if not receipt_ids:
             raise HTTPException(status_code=400, detail="No receipt IDs provided")
         
-        if len(receipt_ids) > 50:
-            raise HTTPException(status_code=400, detail="Cannot delete more than 50 receipts at once")
+        if len(receipt_ids) > MAX_BULK_RECEIPT_DELETE:
+            raise HTTPException(status_code=400, detail=f"Cannot delete more than {MAX_BULK_RECEIPT_DELETE} receipts at once")
         
-        # Bulk soft delete
-        result = await db.receipts.update_many(
-            {"id": {"$in": receipt_ids}, "status": "active"},
-            {
-                "$set": {
-                    "status": "deleted",
-                    "deleted_by": current_admin.id,
-                    "deleted_at": datetime.now(timezone.utc)
-                }
+        # Bulk soft delete, in chunks sent together as one unordered bulk write
+        soft_delete = {
+            "$set": {
+                "status": "deleted",
+                "deleted_by": current_admin.id,
+                "deleted_at": datetime.now(timezone.utc)
             }
-        )
+        }
+        result = await db.receipts.with_options(write_concern=MAJORITY_WRITE_CONCERN).bulk_write([
+            UpdateMany({"id": {"$in": receipt_ids[i:i + RECEIPT_DELETE_CHUNK_SIZE]}, "status": "active"}, soft_delete)
+            for i in range(0, len(receipt_ids), RECEIPT_DELETE_CHUNK_SIZE)
+        ], ordered=False)
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             f"Bulk delete: {result.modified_count} receipts",
             f"Receipts deleted by {current_admin.full_name}",
             "warning"
-        )
+        ))
         
         return {
             "message": f"Successfully deleted {result.modified_count} receipts",
@@ -3390,7 +4024,7 @@ async def get_receipt_templates(current_user: User = Depends(get_current_active_
         # Clean templates data for serialization
         cleaned_templates = []
         for template in templates:
-            cleaned_template = parse_from_mongo(template.copy())
+            cleaned_template = parse_from_mongo(template)
             cleaned_templates.append(cleaned_template)
         
         return cleaned_templates
@@ -3425,14 +4059,17 @@ async def create_receipt_template(template_data: dict, current_user: User = Depe
         if current_user.role != UserRole.ADMIN:
             raise HTTPException(status_code=403, detail="Admin access required")
         
+        now = datetime.now(timezone.utc)
         template = {
             "id": str(uuid.uuid4()),
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc),
+            "created_at": now,
+            "updated_at": now,
             **template_data
         }
         
         await db.receipt_templates.insert_one(template)
+        # A new template may be the default, so drop every cached lookup
+        receipt_template_cache.invalidate()
         return {"message": "Template created successfully", "template_id": template["id"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -3453,6 +4090,7 @@ async def update_receipt_template(template_id: str, template_data: dict, current
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Template not found")
+        receipt_template_cache.invalidate()
         
         return {"message": "Template updated successfully"}
     except Exception as e:
@@ -3474,81 +4112,113 @@ async def delete_receipt_template(template_id: str, current_user: User = Depends
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Template not found")
+        receipt_template_cache.invalidate()
         
         return {"message": "Template deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Receipt templates are read for every receipt and edited rarely
+RECEIPT_TEMPLATE_CACHE_TTL = 300  # seconds; invalidated when a template is written
+receipt_template_cache = TTLCache(RECEIPT_TEMPLATE_CACHE_TTL)
+
+async def load_receipt_template(template_id: Optional[str] = None) -> Optional[dict]:
+    """Get a receipt template by id, or the default template, cached per lookup"""
+    if template_id:
+        return await receipt_template_cache.get(
+            template_id, lambda: db.receipt_templates.find_one({"id": template_id}, {"_id": 0}), cache_none=False
+        )
+    return await receipt_template_cache.get(
+        None, lambda: db.receipt_templates.find_one({"is_default": True}, {"_id": 0})
+    )
+
+# Used when no receipt template is stored; generate_receipt adds a fresh id to each copy
+BASIC_RECEIPT_TEMPLATE = {
+    "name": "Basic Receipt",
+    "is_default": True,
+    "header": {
+        "gym_name": "Iron Paradise Gym",
+        "address": "123 Fitness Street, Gym City, 123456",
+        "phone": "+91-9876543210",
+        "email": "info@ironparadise.com",
+        "website": "www.ironparadise.com"
+    },
+    "styles": {
+        "primary_color": "#2563eb",
+        "secondary_color": "#64748b",
+        "font_family": "Arial, sans-serif",
+        "font_size": "14px"
+    },
+    "sections": {
+        "show_payment_details": True,
+        "show_member_info": True,
+        "show_service_details": True,
+        "show_terms": True
+    },
+    "footer": {
+        "thank_you_message": "Thank you for choosing Iron Paradise Gym!",
+        "terms_text": "All payments are non-refundable. Terms and conditions apply.",
+        "contact_info": "For queries, contact us at info@ironparadise.com"
+    }
+}
+
+async def existing_receipt_response(payment: dict, member: dict, include_html: bool) -> Optional[dict]:
+    """Build the generate_receipt response for a payment that already has a receipt, or None if it has none"""
+    projection = {"_id": 0, "id": 1, "generated_at": 1}
+    if include_html:
+        projection["receipt_html"] = 1
+    
+    existing_receipt = await db.receipts.find_one({"payment_id": payment["id"], "status": "active"}, projection)
+    if not existing_receipt:
+        return None
+    
+    response = {
+        "message": "Receipt already exists",
+        "receipt_id": existing_receipt["id"],
+        "payment_amount": payment.get("amount", 0),
+        "member_name": member.get("name", "Unknown"),
+        "generated_at": existing_receipt["generated_at"]
+    }
+    if include_html:
+        response["receipt_html"] = existing_receipt.get("receipt_html")
+    return response
+
 @app.post("/api/receipts/generate/{payment_id}")
 async def generate_receipt(
     payment_id: str, 
     template_id: str = None, 
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    include_html: bool = True
 ):
     """Generate receipt for payment - Real-time functionality with storage"""
     try:
-        # Get payment details
-        payment = await db.payments.find_one({"id": payment_id})
-        if not payment:
-            # Try to find by transaction_id as backup
-            payment = await db.payments.find_one({"transaction_id": payment_id})
-            if not payment:
-                raise HTTPException(status_code=404, detail="Payment not found")
+        # Get payment details, matching transaction_id as backup, joined with the member in one round trip
+        payments = await db.payments.aggregate([
+            {"$match": {"$or": [{"id": payment_id}, {"transaction_id": payment_id}]}},
+            {"$limit": 1},
+            {"$lookup": {"from": "members", "localField": "member_id", "foreignField": "id", "as": "member"}}
+        ]).to_list(1)
+        if not payments:
+            raise HTTPException(status_code=404, detail="Payment not found")
+        payment = payments[0]
         
         # Get member details
-        member = await db.members.find_one({"id": payment["member_id"]})
-        if not member:
+        members = payment.pop("member")
+        if not members:
             raise HTTPException(status_code=404, detail="Member not found")
+        member = members[0]
         
         # Check if receipt already exists for this payment
-        existing_receipt = await db.receipts.find_one({"payment_id": payment["id"]})
-        if existing_receipt:
-            return {
-                "message": "Receipt already exists",
-                "receipt_id": existing_receipt["id"],
-                "receipt_html": existing_receipt["receipt_html"],
-                "payment_amount": payment.get("amount", 0),
-                "member_name": member.get("name", "Unknown"),
-                "generated_at": existing_receipt["generated_at"]
-            }
+        existing_response = await existing_receipt_response(payment, member, include_html)
+        if existing_response:
+            return existing_response
         
         # Get template
-        if template_id:
-            template = await db.receipt_templates.find_one({"id": template_id})
-        else:
-            template = await db.receipt_templates.find_one({"is_default": True})
+        template = await load_receipt_template(template_id)
         
         if not template:
-            # Create a basic template if none exists
-            template = {
-                "id": str(uuid.uuid4()),
-                "name": "Basic Receipt",
-                "is_default": True,
-                "header": {
-                    "gym_name": "Iron Paradise Gym",
-                    "address": "123 Fitness Street, Gym City, 123456",
-                    "phone": "+91-9876543210",
-                    "email": "info@ironparadise.com",
-                    "website": "www.ironparadise.com"
-                },
-                "styles": {
-                    "primary_color": "#2563eb",
-                    "secondary_color": "#64748b",
-                    "font_family": "Arial, sans-serif",
-                    "font_size": "14px"
-                },
-                "sections": {
-                    "show_payment_details": True,
-                    "show_member_info": True,
-                    "show_service_details": True,
-                    "show_terms": True
-                },
-                "footer": {
-                    "thank_you_message": "Thank you for choosing Iron Paradise Gym!",
-                    "terms_text": "All payments are non-refundable. Terms and conditions apply.",
-                    "contact_info": "For queries, contact us at info@ironparadise.com"
-                }
-            }
+            # Use a basic template if none exists
+            template = {**BASIC_RECEIPT_TEMPLATE, "id": str(uuid.uuid4())}
         
         # Generate receipt HTML
         receipt_html = await generate_receipt_html(payment, member, template)
@@ -3568,14 +4238,21 @@ async def generate_receipt(
             "status": "active"
         }
         
-        await db.receipts.insert_one(receipt_record)
+        try:
+            await db.receipts.insert_one(receipt_record)
+        except DuplicateKeyError:
+            # A concurrent request stored the receipt for this payment first
+            existing_response = await existing_receipt_response(payment, member, include_html)
+            if existing_response:
+                return existing_response
+            raise
         
         # Send notification
-        await send_system_notification(
+        run_in_background(send_system_notification(
             "Receipt Generated",
             f"Receipt generated for {member.get('name')} - ₹{payment.get('amount', 0)} by {current_user.full_name}",
             "info"
-        )
+        ))
         
         return {
             "message": "Receipt generated and stored successfully",
@@ -3584,6 +4261,8 @@ async def generate_receipt(
             "payment_amount": payment.get("amount", 0),
             "member_name": member.get("name", "Unknown")
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating receipt: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -3599,72 +4278,49 @@ async def generate_payment_receipt(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def generate_receipt_html(payment: dict, member: dict, template: dict) -> str:
-    """Generate HTML receipt from template"""
-    try:
-        # Format payment date safely
-        payment_date = payment.get('payment_date', datetime.now(timezone.utc))
-        if isinstance(payment_date, str):
-            payment_date = datetime.fromisoformat(payment_date)
-        formatted_date = payment_date.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Build member info section
-        member_info_section = ""
-        if template['sections']['show_member_info']:
-            member_info_section = f"""
+# Receipt HTML templates; the literals are built once at import and filled per call with str.format_map
+RECEIPT_MEMBER_INFO_TEMPLATE = """
                 <div class="section">
                     <div class="section-title">Member Information</div>
                     <div class="info-row">
                         <span class="info-label">Name:</span>
-                        <span class="info-value">{member.get("name", "N/A")}</span>
+                        <span class="info-value">{member_name}</span>
                     </div>
                     <div class="info-row">
                         <span class="info-label">Email:</span>
-                        <span class="info-value">{member.get("email", "N/A")}</span>
+                        <span class="info-value">{member_email}</span>
                     </div>
                     <div class="info-row">
                         <span class="info-label">Phone:</span>
-                        <span class="info-value">{member.get("phone", "N/A")}</span>
+                        <span class="info-value">{member_phone}</span>
                     </div>
                     <div class="info-row">
                         <span class="info-label">Member ID:</span>
-                        <span class="info-value">{member.get("id", "N/A")}</span>
+                        <span class="info-value">{member_id}</span>
                     </div>
                 </div>
             """
-        
-        # Build service details section
-        service_details_section = ""
-        if template['sections']['show_service_details']:
-            service_details_section = f"""
+
+RECEIPT_SERVICE_DETAILS_TEMPLATE = """
                 <div class="section">
                     <div class="section-title">Service Details</div>
                     <div class="info-row">
                         <span class="info-label">Service:</span>
-                        <span class="info-value">{payment.get("description", "Gym Service")}</span>
+                        <span class="info-value">{service_description}</span>
                     </div>
                     <div class="info-row">
                         <span class="info-label">Amount:</span>
-                        <span class="info-value">₹{payment.get("amount", 0)}</span>
+                        <span class="info-value">₹{amount}</span>
                     </div>
                 </div>
             """
-        
-        # Build terms section
-        terms_section = ""
-        if template['sections']['show_terms']:
-            terms_section = f'<div class="terms">{template["footer"]["terms_text"]}</div>'
-        
-        html_template = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Payment Receipt</title>
-            <style>
+
+RECEIPT_TERMS_TEMPLATE = '<div class="terms">{terms_text}</div>'
+
+RECEIPT_CSS_TEMPLATE = """
                 body {{
-                    font-family: {template['styles']['font_family']};
-                    font-size: {template['styles']['font_size']};
+                    font-family: {font_family};
+                    font-size: {font_size};
                     margin: 0;
                     padding: 20px;
                     background-color: #f5f5f5;
@@ -3679,18 +4335,18 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
                 }}
                 .header {{
                     text-align: center;
-                    border-bottom: 2px solid {template['styles']['primary_color']};
+                    border-bottom: 2px solid {primary_color};
                     padding-bottom: 20px;
                     margin-bottom: 30px;
                 }}
                 .gym-name {{
-                    color: {template['styles']['primary_color']};
+                    color: {primary_color};
                     font-size: 28px;
                     font-weight: bold;
                     margin-bottom: 10px;
                 }}
                 .gym-info {{
-                    color: {template['styles']['secondary_color']};
+                    color: {secondary_color};
                     font-size: 14px;
                     line-height: 1.6;
                 }}
@@ -3698,7 +4354,7 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
                     margin-bottom: 25px;
                 }}
                 .section-title {{
-                    color: {template['styles']['primary_color']};
+                    color: {primary_color};
                     font-size: 18px;
                     font-weight: bold;
                     margin-bottom: 15px;
@@ -3713,13 +4369,13 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
                 }}
                 .info-label {{
                     font-weight: bold;
-                    color: {template['styles']['secondary_color']};
+                    color: {secondary_color};
                 }}
                 .info-value {{
                     color: #333;
                 }}
                 .amount-total {{
-                    background-color: {template['styles']['primary_color']};
+                    background-color: {primary_color};
                     color: white;
                     padding: 15px;
                     border-radius: 5px;
@@ -3732,39 +4388,47 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
                     text-align: center;
                     margin-top: 40px;
                     padding-top: 20px;
-                    border-top: 2px solid {template['styles']['primary_color']};
+                    border-top: 2px solid {primary_color};
                 }}
                 .thank-you {{
-                    color: {template['styles']['primary_color']};
+                    color: {primary_color};
                     font-size: 18px;
                     font-weight: bold;
                     margin-bottom: 15px;
                 }}
                 .terms {{
-                    color: {template['styles']['secondary_color']};
+                    color: {secondary_color};
                     font-size: 12px;
                     line-height: 1.5;
                     margin-bottom: 10px;
                 }}
                 .contact-info {{
-                    color: {template['styles']['secondary_color']};
+                    color: {secondary_color};
                     font-size: 12px;
                 }}
                 @media print {{
                     body {{ background-color: white; }}
                     .receipt-container {{ box-shadow: none; }}
                 }}
-            </style>
+            """
+
+RECEIPT_HTML_TEMPLATE = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>Payment Receipt</title>
+            <style>{css}</style>
         </head>
         <body>
             <div class="receipt-container">
                 <div class="header">
-                    <div class="gym-name">{template['header']['gym_name']}</div>
+                    <div class="gym-name">{gym_name}</div>
                     <div class="gym-info">
-                        {template['header']['address']}<br>
-                        Phone: {template['header']['phone']}<br>
-                        Email: {template['header']['email']}<br>
-                        Website: {template['header']['website']}
+                        {address}<br>
+                        Phone: {phone}<br>
+                        Email: {email}<br>
+                        Website: {website}
                     </div>
                 </div>
                 
@@ -3772,7 +4436,7 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
                     <div class="section-title">Payment Receipt</div>
                     <div class="info-row">
                         <span class="info-label">Receipt ID:</span>
-                        <span class="info-value">{payment['id']}</span>
+                        <span class="info-value">{receipt_id}</span>
                     </div>
                     <div class="info-row">
                         <span class="info-label">Payment Date:</span>
@@ -3780,7 +4444,7 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
                     </div>
                     <div class="info-row">
                         <span class="info-label">Payment Method:</span>
-                        <span class="info-value">{payment.get('payment_method', 'Online')}</span>
+                        <span class="info-value">{payment_method}</span>
                     </div>
                 </div>
                 
@@ -3789,20 +4453,96 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
                 {service_details_section}
                 
                 <div class="amount-total">
-                    Total Paid: ₹{payment.get('amount', 0)}
+                    Total Paid: ₹{amount}
                 </div>
                 
                 <div class="footer">
-                    <div class="thank-you">{template['footer']['thank_you_message']}</div>
+                    <div class="thank-you">{thank_you_message}</div>
                     {terms_section}
-                    <div class="contact-info">{template['footer']['contact_info']}</div>
+                    <div class="contact-info">{contact_info}</div>
                 </div>
             </div>
         </body>
         </html>
         """
+
+# Characters that could close a CSS rule or the <style> element from inside a style value
+RECEIPT_CSS_UNSAFE_CHARS = re.compile(r"[<>{}]")
+
+@functools.lru_cache(maxsize=32)
+def render_receipt_css(font_family: str, font_size: str, primary_color: str, secondary_color: str) -> str:
+    """Render the receipt stylesheet, cached per style combination since most receipts share one template"""
+    styles = {
+        "font_family": font_family,
+        "font_size": font_size,
+        "primary_color": primary_color,
+        "secondary_color": secondary_color
+    }
+    return RECEIPT_CSS_TEMPLATE.format_map({key: RECEIPT_CSS_UNSAFE_CHARS.sub("", value) for key, value in styles.items()})
+
+def escape_receipt_fields(fields: dict) -> dict:
+    """HTML-escape text values before they are interpolated into a receipt template"""
+    return {key: html.escape(str(value)) for key, value in fields.items()}
+
+async def generate_receipt_html(payment: dict, member: dict, template: dict) -> str:
+    """Generate HTML receipt from template"""
+    try:
+        # Format payment date safely
+        payment_date = to_utc_datetime(payment.get('payment_date', datetime.now(timezone.utc)))
+        formatted_date = payment_date.strftime('%Y-%m-%d %H:%M:%S')
+        amount = payment.get("amount", 0)
+        
+        # Build member info section
+        member_info_section = ""
+        if template['sections']['show_member_info']:
+            member_info_section = RECEIPT_MEMBER_INFO_TEMPLATE.format_map(escape_receipt_fields({
+                "member_name": member.get("name", "N/A"),
+                "member_email": member.get("email", "N/A"),
+                "member_phone": member.get("phone", "N/A"),
+                "member_id": member.get("id", "N/A")
+            }))
         
-        return html_template
+        # Build service details section
+        service_details_section = ""
+        if template['sections']['show_service_details']:
+            service_details_section = RECEIPT_SERVICE_DETAILS_TEMPLATE.format_map(escape_receipt_fields({
+                "service_description": payment.get("description", "Gym Service"),
+                "amount": amount
+            }))
+        
+        # Build terms section
+        terms_section = ""
+        if template['sections']['show_terms']:
+            terms_section = RECEIPT_TERMS_TEMPLATE.format_map(escape_receipt_fields({"terms_text": template["footer"]["terms_text"]}))
+        
+        styles = template['styles']
+        header = template['header']
+        footer = template['footer']
+        return RECEIPT_HTML_TEMPLATE.format_map({
+            # Style values sit inside <style>, where entities are not decoded, so render_receipt_css strips unsafe characters instead
+            "css": render_receipt_css(
+                str(styles['font_family']),
+                str(styles['font_size']),
+                str(styles['primary_color']),
+                str(styles['secondary_color'])
+            ),
+            "member_info_section": member_info_section,
+            "service_details_section": service_details_section,
+            "terms_section": terms_section,
+            **escape_receipt_fields({
+                "gym_name": header['gym_name'],
+                "address": header['address'],
+                "phone": header['phone'],
+                "email": header['email'],
+                "website": header['website'],
+                "receipt_id": payment['id'],
+                "formatted_date": formatted_date,
+                "payment_method": payment.get('payment_method', 'Online'),
+                "amount": amount,
+                "thank_you_message": footer['thank_you_message'],
+                "contact_info": footer['contact_info']
+            })
+        })
         
     except Exception as e:
         logger.error(f"Error generating receipt HTML: {e}")
@@ -3811,7 +4551,7 @@ async def generate_receipt_html(payment: dict, member: dict, template: dict) ->
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Cleanup on shutdown"""
-    global reminder_service_instance
+    global reminder_service_instance, membership_sweep_task, notification_flush_task
     try:
         if reminder_service_instance:
             reminder_service_instance.stop()
@@ -3819,4 +4559,16 @@ async def shutdown_db_client():
     except Exception as e:
         logger.error(f"Error stopping reminder service: {e}")
     
+    if membership_sweep_task:
+        membership_sweep_task.cancel()
+        logger.info("Membership sweep stopped")
+    
+    # Let the notification writer persist anything still queued, then stop it
+    if notification_flush_task:
+        try:
+            await asyncio.wait_for(notification_queue.join(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning(f"{notification_queue.qsize()} queued notifications not written before shutdown")
+        notification_flush_task.cancel()
+    
     client.close()
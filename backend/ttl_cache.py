@@ -0,0 +1,48 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+class TTLCache:
+    """In-process cache whose entries expire a fixed number of seconds after they are loaded"""
+    
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._generation = 0
+    
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]], cache_none: bool = True) -> Any:
+        """Get the cached value for key, calling loader when it is missing or expired; cache_none=False skips storing misses"""
+        entry = self._entries.get(key)
+        if entry:
+            if time.monotonic() < entry[0]:
+                return entry[1]
+            del self._entries[key]
+        
+        generation = self._generation
+        value = await loader()
+        # An invalidate() while the loader ran may have made its result stale, so return it without storing
+        if generation == self._generation and (value is not None or cache_none):
+            self._store(key, value)
+        return value
+    
+    def _store(self, key: Hashable, value: Any):
+        """Store a value, purging expired entries and the oldest one when the cache is full"""
+        now = time.monotonic()
+        # Every entry shares one TTL, so insertion order is expiry order and expired entries sit at the front
+        while self._entries and next(iter(self._entries.values()))[0] <= now:
+            self._entries.popitem(last=False)
+        if len(self._entries) >= self.maxsize:
+            self._entries.popitem(last=False)
+        self._entries[key] = (now + self.ttl, value)
+    
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one cached value after it is updated, or every value when no key is given"""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
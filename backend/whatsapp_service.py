@@ -1,12 +1,22 @@
 import os
 import logging
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Set
 import urllib.parse
+import uuid
 import asyncio
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Reminder settings are read for every member in a batch, so they are cached briefly
+SETTING_CACHE_TTL = 60  # seconds
+
+# Characters kept when cleaning a phone number
+PHONE_NUMBER_CHARS = frozenset('0123456789+')
+
+WHATSAPP_LINK_PREFIX = "https://wa.me/"
+
 class DirectWhatsAppService:
     """Direct WhatsApp service without Twilio complications"""
     
@@ -15,11 +25,12 @@ class DirectWhatsAppService:
         self.business_number = os.environ.get('WHATSAPP_BUSINESS_NUMBER', '+917099197780')
         self.business_name = os.environ.get('WHATSAPP_BUSINESS_NAME', 'Iron Paradise Gym')
         self.enabled = os.environ.get('WHATSAPP_ENABLED', 'true').lower() == 'true'
+        self._setting_cache = TTLCache(SETTING_CACHE_TTL)
         
         logger.info(f"Direct WhatsApp Service initialized with business number: {self.business_number}")
     
-    async def send_reminder(self, member: Dict[str, Any], days_before_expiry: int = 7) -> Dict[str, Any]:
-        """Send WhatsApp reminder directly to member"""
+    async def send_reminder(self, member: Dict[str, Any], days_before_expiry: int = 7, log: bool = True, sent_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Send WhatsApp reminder directly to member; with log=False the log record is returned for the caller to batch"""
         try:
             if not self.enabled:
                 return {"success": False, "error": "WhatsApp service disabled"}
@@ -35,10 +46,7 @@ class DirectWhatsAppService:
             # Create WhatsApp link for direct sending
             whatsapp_link = self.create_whatsapp_link(member_phone, message)
             
-            # Log the reminder attempt
-            await self.log_reminder(member, message, whatsapp_link, days_before_expiry)
-            
-            return {
+            result = {
                 "success": True,
                 "message": f"WhatsApp reminder link created for {member['name']}",
                 "whatsapp_link": whatsapp_link,
@@ -46,10 +54,47 @@ class DirectWhatsAppService:
                 "message_content": message
             }
             
+            # Log the reminder attempt
+            if log:
+                await self.log_reminder(member, message, whatsapp_link, days_before_expiry)
+            else:
+                result["reminder_log"] = self.build_reminder_log(member, message, whatsapp_link, days_before_expiry, sent_at)
+            
+            return result
+            
         except Exception as e:
             logger.error(f"Error sending WhatsApp reminder: {e}")
             return {"success": False, "error": str(e)}
     
+    async def send_reminders_batch(self, members: List[Dict[str, Any]], days_before_expiry: int = 7, concurrency: int = 15) -> list:
+        """Send reminders to many members, writing their reminder logs with one insert_many.
+        
+        Returns one send_reminder result per member, or the exception raised for it.
+        """
+        # Bounded so a large batch doesn't flood the service
+        semaphore = asyncio.Semaphore(concurrency)
+        # The whole batch is logged as sent at one instant
+        sent_at = datetime.now(timezone.utc)
+        
+        async def send_one(member):
+            async with semaphore:
+                return await self.send_reminder(member, days_before_expiry, log=False, sent_at=sent_at)
+        
+        results = await asyncio.gather(*(send_one(member) for member in members), return_exceptions=True)
+        
+        reminder_logs = [
+            result.pop("reminder_log") for result in results
+            if not isinstance(result, BaseException) and result["success"]
+        ]
+        if reminder_logs:
+            try:
+                await self.db.reminder_logs.insert_many(reminder_logs, ordered=False)
+                logger.info(f"Reminders logged for {len(reminder_logs)} members")
+            except Exception as e:
+                logger.error(f"Error logging reminders: {e}")
+        
+        return results
+    
     async def send_custom_reminder(self, member: Dict[str, Any], custom_message: str, days_before_expiry: int = 7) -> Dict[str, Any]:
         """Send custom WhatsApp reminder to member"""
         try:
@@ -100,13 +145,11 @@ Contact: {self.business_number}"""
         # Remove WhatsApp prefix if present
         phone = phone.replace('whatsapp:', '').replace('+', '')
         
-        # URL encode the message
-        encoded_message = urllib.parse.quote(message)
+        # URL encode the message from its UTF-8 bytes, as quote() would after encoding it
+        encoded_message = urllib.parse.quote_from_bytes(message.encode('utf-8'))
         
         # Create WhatsApp link
-        whatsapp_link = f"https://wa.me/{phone}?text={encoded_message}"
-        
-        return whatsapp_link
+        return f"{WHATSAPP_LINK_PREFIX}{phone}?text={encoded_message}"
     
     def clean_phone_number(self, phone: str) -> str:
         """Clean and validate phone number"""
@@ -114,8 +157,7 @@ Contact: {self.business_number}"""
             return ""
         
         # Remove all non-digit characters except +
-        import re
-        phone = re.sub(r'[^\d+]', '', phone)
+        phone = ''.join(filter(PHONE_NUMBER_CHARS.__contains__, phone))
         
         # Add +91 if not present and number looks Indian
         if not phone.startswith('+'):
@@ -137,7 +179,10 @@ Contact: {self.business_number}"""
             expiry_date_str = member.get('membership_end', '')
             if expiry_date_str:
                 try:
-                    expiry_date = datetime.fromisoformat(expiry_date_str).strftime('%d %b %Y')
+                    if isinstance(expiry_date_str, datetime):
+                        expiry_date = expiry_date_str.strftime('%d %b %Y')
+                    else:
+                        expiry_date = datetime.fromisoformat(expiry_date_str).strftime('%d %b %Y')
                 except:
                     expiry_date = "Soon"
             else:
@@ -155,8 +200,14 @@ Contact: {self.business_number}"""
             else:
                 urgency = f"in {days} days"
             
-            # Get editable reminder template
-            template_settings = await self.db.gym_settings.find_one({"setting_name": "reminder_template"})
+            # Get editable reminder template and bank account details; the reads are independent
+            template_settings, bank_settings = await asyncio.gather(
+                self.get_cached_setting("reminder_template"),
+                self.get_cached_setting("bank_account"),
+                return_exceptions=True
+            )
+            if isinstance(template_settings, Exception):
+                raise template_settings
             if template_settings and "message_template" in template_settings:
                 message_template = template_settings["message_template"]["message"]
             else:
@@ -189,21 +240,8 @@ Thank you for choosing {business_name}! 💪
 - {business_name} Team"""
             
             # Get bank account details
-            try:
-                bank_settings = await self.db.gym_settings.find_one({"setting_name": "bank_account"})
-                if bank_settings and "account_details" in bank_settings:
-                    account = bank_settings["account_details"]
-                else:
-                    # Default bank account details
-                    account = {
-                        "account_name": "Electroforum",
-                        "account_number": "123456789012", 
-                        "ifsc_code": "BANK0001234",
-                        "bank_name": "State Bank of India",
-                        "upi_id": "electroforum@paytm"
-                    }
-            except Exception as e:
-                logger.error(f"Error fetching bank details: {e}")
+            if isinstance(bank_settings, Exception):
+                logger.error(f"Error fetching bank details: {bank_settings}")
                 account = {
                     "account_name": "Electroforum",
                     "account_number": "Contact Admin",
@@ -211,6 +249,17 @@ Thank you for choosing {business_name}! 💪
                     "bank_name": "Contact Admin",
                     "upi_id": "Contact Admin"
                 }
+            elif bank_settings and "account_details" in bank_settings:
+                account = bank_settings["account_details"]
+            else:
+                # Default bank account details
+                account = {
+                    "account_name": "Electroforum",
+                    "account_number": "123456789012", 
+                    "ifsc_code": "BANK0001234",
+                    "bank_name": "State Bank of India",
+                    "upi_id": "electroforum@paytm"
+                }
             
             # Format message with variables
             formatted_message = message_template.format(
@@ -233,38 +282,56 @@ Thank you for choosing {business_name}! 💪
             # Fallback simple message
             return f"""Hi {member['name']}, your gym membership expires soon. Please visit {self.business_name} reception to renew. Contact: {self.business_number}"""
     
+    async def get_cached_setting(self, setting_name: str) -> Optional[Dict[str, Any]]:
+        """Get a gym_settings document by name, cached for SETTING_CACHE_TTL seconds"""
+        return await self._setting_cache.get(
+            setting_name,
+            lambda: self.db.gym_settings.find_one({"setting_name": setting_name}, {"_id": 0})
+        )
+    
+    def invalidate_setting_cache(self, setting_name: Optional[str] = None):
+        """Drop a cached setting after it is updated, or all of them when no name is given"""
+        self._setting_cache.invalidate(setting_name)
+    
+    def build_reminder_log(self, member: Dict[str, Any], message: str, whatsapp_link: str, days_before_expiry: int, sent_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Build the reminder_logs record for a reminder attempt, stamped with sent_at or the current time"""
+        if sent_at is None:
+            sent_at = datetime.now(timezone.utc)
+        return {
+            "id": str(uuid.uuid4()),
+            "member_id": member['id'],
+            "member_name": member['name'],
+            "member_phone": member.get('phone', ''),
+            "message_content": message,
+            "whatsapp_link": whatsapp_link,
+            "days_before_expiry": days_before_expiry,
+            "sent_at": sent_at,
+            "method": "direct_whatsapp",
+            "status": "link_created",
+            "business_number": self.business_number
+        }
+    
     async def log_reminder(self, member: Dict[str, Any], message: str, whatsapp_link: str, days_before_expiry: int):
         """Log reminder attempt in database"""
         try:
-            reminder_log = {
-                "id": f"reminder_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{member['id'][:8]}",
-                "member_id": member['id'],
-                "member_name": member['name'],
-                "member_phone": member.get('phone', ''),
-                "message_content": message,
-                "whatsapp_link": whatsapp_link,
-                "days_before_expiry": days_before_expiry,
-                "sent_at": datetime.now(timezone.utc),
-                "method": "direct_whatsapp",
-                "status": "link_created",
-                "business_number": self.business_number
-            }
-            
+            reminder_log = self.build_reminder_log(member, message, whatsapp_link, days_before_expiry)
             await self.db.reminder_logs.insert_one(reminder_log)
             logger.info(f"Reminder logged for member {member['name']}")
             
         except Exception as e:
             logger.error(f"Error logging reminder: {e}")
     
-    async def get_reminder_history(self, member_id: Optional[str] = None) -> list:
-        """Get reminder history"""
+    async def get_reminder_history(self, member_id: Optional[str] = None, fields: Optional[Set[str]] = None, limit: int = 1000) -> list:
+        """Get reminder history, returning only the given fields when listed"""
         try:
             if member_id:
                 query = {"member_id": member_id}
             else:
                 query = {}
             
-            history = await self.db.reminder_logs.find(query).sort("sent_at", -1).to_list(1000)
+            # Listings rarely need message_content and whatsapp_link, the bulk of each log
+            projection = {"_id": 0, **{field: 1 for field in fields}} if fields else None
+            history = await self.db.reminder_logs.find(query, projection).sort("sent_at", -1).to_list(limit)
             return history
             
         except Exception as e:
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+
+import pytest
+
+bson = pytest.importorskip("bson")
+fastapi = pytest.importorskip("fastapi")
+
+from pagination import keyset_filter, next_cursor_headers
+
+
+def test_cursor_round_trips_datetime():
+    sort = [("payment_date", -1), ("id", -1)]
+    payment_date = datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)
+    docs = [{"payment_date": payment_date, "id": "b"}]
+    
+    cursor = next_cursor_headers(docs, sort, 1)["X-Next-Cursor"]
+    
+    assert keyset_filter(sort, cursor) == {"$or": [
+        {"payment_date": {"$lt": payment_date}},
+        {"payment_date": payment_date, "id": {"$lt": "b"}},
+    ]}
+
+
+def test_cursor_round_trips_object_id():
+    sort = [("sent_at", -1), ("_id", -1)]
+    sent_at = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    object_id = bson.ObjectId()
+    docs = [{"sent_at": sent_at, "_id": object_id}]
+    
+    cursor = next_cursor_headers(docs, sort, 1)["X-Next-Cursor"]
+    
+    assert keyset_filter(sort, cursor)["$or"][1] == {"sent_at": sent_at, "_id": {"$lt": object_id}}
+
+
+def test_compound_filter_ascending():
+    sort = [("year", 1), ("month", 1)]
+    cursor = next_cursor_headers([{"year": 2025, "month": 12}], sort, 1)["X-Next-Cursor"]
+    
+    assert keyset_filter(sort, cursor) == {"$or": [
+        {"year": {"$gt": 2025}},
+        {"year": 2025, "month": {"$gt": 12}},
+    ]}
+
+
+def test_compound_filter_descending():
+    sort = [("year", -1), ("month", -1)]
+    cursor = next_cursor_headers([{"year": 2025, "month": 12}], sort, 1)["X-Next-Cursor"]
+    
+    assert keyset_filter(sort, cursor) == {"$or": [
+        {"year": {"$lt": 2025}},
+        {"year": 2025, "month": {"$lt": 12}},
+    ]}
+
+
+def test_no_cursor_selects_everything():
+    assert keyset_filter([("id", 1)], None) == {}
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "AAAA", "BQAAAAA="])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(fastapi.HTTPException) as error:
+        keyset_filter([("id", 1)], cursor)
+    assert error.value.status_code == 400
+
+
+def test_cursor_with_wrong_key_count_is_rejected():
+    cursor = next_cursor_headers([{"year": 2025, "month": 12}], [("year", -1), ("month", -1)], 1)["X-Next-Cursor"]
+    
+    with pytest.raises(fastapi.HTTPException) as error:
+        keyset_filter([("id", 1)], cursor)
+    assert error.value.status_code == 400
+
+
+def test_short_page_has_no_cursor():
+    sort = [("id", 1)]
+    
+    assert next_cursor_headers([{"id": "a"}], sort, 2) == {}
+    assert next_cursor_headers([], sort, 1) == {}
+    assert "X-Next-Cursor" in next_cursor_headers([{"id": "a"}, {"id": "b"}], sort, 2)
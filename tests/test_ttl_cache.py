@@ -0,0 +1,110 @@
+import asyncio
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+def make_loader(values):
+    """Return a loader that yields values in order and records how often it ran"""
+    calls = []
+    
+    async def loader():
+        calls.append(1)
+        return values[len(calls) - 1]
+    
+    return loader, calls
+
+
+def test_get_caches_loaded_value():
+    cache = TTLCache(ttl=60)
+    loader, calls = make_loader(["a", "b"])
+    
+    assert asyncio.run(cache.get("key", loader)) == "a"
+    assert asyncio.run(cache.get("key", loader)) == "a"
+    assert len(calls) == 1
+
+
+def test_get_reloads_after_expiry(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    cache = TTLCache(ttl=60)
+    loader, calls = make_loader(["a", "b"])
+    
+    assert asyncio.run(cache.get("key", loader)) == "a"
+    clock.now += 59
+    assert asyncio.run(cache.get("key", loader)) == "a"
+    clock.now += 1
+    assert asyncio.run(cache.get("key", loader)) == "b"
+    assert len(calls) == 2
+
+
+def test_invalidate_key_and_all():
+    cache = TTLCache(ttl=60)
+    loader, _ = make_loader(["a", "b", "c", "d"])
+    other_loader, _ = make_loader(["x", "y"])
+    
+    asyncio.run(cache.get("key", loader))
+    asyncio.run(cache.get("other", other_loader))
+    cache.invalidate("key")
+    assert asyncio.run(cache.get("key", loader)) == "b"
+    assert asyncio.run(cache.get("other", other_loader)) == "x"
+    
+    cache.invalidate()
+    assert len(cache) == 0
+    assert asyncio.run(cache.get("key", loader)) == "c"
+    assert asyncio.run(cache.get("other", other_loader)) == "y"
+
+
+def test_cache_none():
+    cache = TTLCache(ttl=60)
+    loader, calls = make_loader([None, None, None])
+    
+    asyncio.run(cache.get("cached", loader))
+    asyncio.run(cache.get("cached", loader))
+    assert len(calls) == 1
+    
+    asyncio.run(cache.get("missing", loader, cache_none=False))
+    asyncio.run(cache.get("missing", loader, cache_none=False))
+    assert len(calls) == 3
+    assert "missing" not in cache._entries
+
+
+def test_invalidate_during_load_discards_result():
+    cache = TTLCache(ttl=60)
+    loaded = iter(["stale", "fresh"])
+    
+    async def loader():
+        value = next(loaded)
+        if value == "stale":
+            cache.invalidate("key")
+        return value
+    
+    assert asyncio.run(cache.get("key", loader)) == "stale"
+    assert asyncio.run(cache.get("key", loader)) == "fresh"
+
+
+def test_maxsize_evicts_expired_then_oldest(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    cache = TTLCache(ttl=60, maxsize=3)
+    
+    async def load_key():
+        return "value"
+    
+    asyncio.run(cache.get("expired", load_key))
+    clock.now += 60
+    asyncio.run(cache.get("a", load_key))
+    asyncio.run(cache.get("b", load_key))
+    assert list(cache._entries) == ["a", "b"]
+    
+    asyncio.run(cache.get("c", load_key))
+    asyncio.run(cache.get("d", load_key))
+    assert list(cache._entries) == ["b", "c", "d"]